@@ -1,13 +1,29 @@
-from flask import Flask, request, jsonify
+import time
+# Start of the app import, for the startup timing report (GET /startup).
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify, g, stream_with_context, url_for
 from flask_cors import CORS
-import numpy as np
-from werkzeug.utils import secure_filename
+import io
 import os
-import pickle
-import pandas as pd
-from sklearn.preprocessing import LabelEncoder, RobustScaler
-import pdfplumber  # Using pdfplumber for PDF extraction
-import re  # For regex extraction
+import hmac
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+from bulk_score import detect_format, read_rows, stream_ndjson, validate_row
+from extraction_pool import extraction_pool, ExtractionError
+from inference import build_raw_feature_dict
+from job_queue import JobQueue, QueueFull, check_callback_url
+from metrics import (metrics, stage, observe_stages, observe_extraction, failure_reason, stats_gauges,
+                     SamplingProfiler, PROFILER_ENABLED, REQUESTS, REQUEST_SECONDS, EXTRACTION_FAILURES,
+                     CACHE_LOOKUPS)
+from micro_batcher import MicroBatcher
+from model_registry import registry, PRELOAD_MODELS, CURRENT_POINTER, SHADOW_POINTER
+from pdf_precheck import precheck_pdf, PrecheckError, PDF_PRECHECK
+from report_renderer import generate_report, structured_report
+from result_cache import result_cache, pdf_cache_key, features_cache_key
+from rules import rule_set
+from shadow_scorer import shadow_scorer
 
 app = Flask(__name__)
 CORS(app)
@@ -15,345 +31,143 @@ UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'pdf'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB
+# /predict_stream bodies are read incrementally, so they may be much larger than uploads.
+STREAM_MAX_CONTENT_LENGTH = int(os.environ.get('STREAM_MAX_CONTENT_LENGTH', 10 * 1024 * 1024 * 1024))
+# Uploads up to this size are parsed straight from memory; larger ones spill to a temp file.
+app.config['UPLOAD_SPILL_THRESHOLD'] = int(os.environ.get('UPLOAD_SPILL_THRESHOLD', 2 * 1024 * 1024))
+# Bearer token required by POST /models/reload. Unset, the endpoint is disabled and model
+# versions are only switched with `python model_registry.py promote/shadow`.
+MODEL_ADMIN_TOKEN = os.environ.get('MODEL_ADMIN_TOKEN')
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# Load global objects (model, scaler, and label encoder)
-backend_dir = os.path.dirname(os.path.abspath(__file__))
-models_dir = os.path.join(backend_dir, "models")
-model_path = os.path.join(models_dir, "xgboost_model.sav")
-scaler_path = os.path.join(models_dir, "scaler.pkl")
-label_encoder_sex_path = os.path.join(models_dir, "label_encoder_sex.pkl")
-
-os.makedirs(models_dir, exist_ok=True)
-
-try:
-    with open(model_path, 'rb') as f:
-        model = pickle.load(f)
-    with open(scaler_path, 'rb') as f:
-        scaler = pickle.load(f)
-    with open(label_encoder_sex_path, 'rb') as f:
-        label_encoder_sex = pickle.load(f)
-    print("Global objects loaded successfully from models directory!")
-except Exception as e:
-    print(f"Error loading global objects: {str(e)}")
-    model = None
+# The model, scaler and label encoder are loaded on first use, or right here with
+# PRELOAD_MODELS=1 (under gunicorn, gunicorn.conf.py loads them before forking workers).
+if PRELOAD_MODELS:
+    registry.load()
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def extract_features_from_pdf(pdf_path):
+@contextmanager
+def upload_source(stream):
     """
-    Extracts required features from a CBC report using pdfplumber.
-    This function extracts patient info (Age and Sex) and CBC test values based on
-    the provided report format. Expected tests and their labels:
-      - Hemoglobin              → "Hemoglobin"
-      - Leucocyte               → "Total Leukocyte Count"
-      - Thrombocyte             → "Platelet Count" (may include "(Thrombocyte)")
-      - Erythrocyte             → "Total RBC Count" (may include "(Erythrocyte)")
-      - Hematocrit              → "Hematocrit Value, Hct"
-      - Mcv                     → "Mean Corpuscular Volume, MCV"
-      - Mch                     → "Mean Cell Haemoglobin, MCH"
-      - Mchc                    → "Mean Cell Haemoglobin CON, MCHC"
+    Yields the uploaded PDF read from the binary `stream` in a form extract_features_from_pdf
+    accepts: the raw bytes for normal uploads, or the path of a uniquely named temp file for
+    uploads above UPLOAD_SPILL_THRESHOLD. The temp file is removed on exit.
     """
-    with pdfplumber.open(pdf_path) as pdf:
-        text = ""
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-    lines = [line.strip() for line in text.splitlines() if line.strip()]
-    
-    extracted_data = {}
-
-    # --- Extract Patient Info using regex ---
-    for line in lines:
-        if line.startswith("Age:"):
-            age_match = re.search(r"Age:\s*(\d+(\.\d+)?)", line)
-            if age_match:
-                extracted_data["Age"] = float(age_match.group(1))
-        if line.startswith("Sex:"):
-            sex_match = re.search(r"Sex:\s*([MF])", line, re.IGNORECASE)
-            if sex_match:
-                extracted_data["Sex"] = sex_match.group(1).upper()
-
-    # --- Extract CBC Test Values ---
-    cbc_mappings = {
-        'Hemoglobin': "Hemoglobin",
-        'Leucocyte': "Total Leukocyte Count",
-        'Thrombocyte': "Platelet Count",
-        'Erythrocyte': "Total RBC Count",
-        'Hematocrit': "Hematocrit Value, Hct",
-        'Mcv': "Mean Corpuscular Volume, MCV",
-        'Mch': "Mean Cell Haemoglobin, MCH",
-        'Mchc': "Mean Cell Haemoglobin CON, MCHC"
-    }
-    
-    # Locate the CBC section by finding "COMPLETE BLOOD COUNT"
-    start_index = None
-    for i, line in enumerate(lines):
-        if "COMPLETE BLOOD COUNT" in line.upper():
-            start_index = i
-            break
-    if start_index is None:
-        raise ValueError("Could not locate CBC section in the report.")
-    
-    # Find the table header (e.g., a line containing "TEST")
-    table_start = None
-    for i in range(start_index, len(lines)):
-        if "TEST" in lines[i].upper():
-            table_start = i
-            break
-    if table_start is None:
-        raise ValueError("Could not locate CBC table header in the report.")
-    
-    # For each test, search for its numeric value.
-    for i in range(table_start + 1, len(lines)):
-        line = lines[i]
-        for feature, indicator in cbc_mappings.items():
-            if indicator.upper() in line.upper():
-                # First try to extract a numeric value from the same line.
-                number_match = re.search(r"(\d+(\.\d+)?)", line)
-                if number_match:
-                    extracted_data[feature] = float(number_match.group(1))
-                    continue  # Found the value, move to the next feature.
-                # If not found, then scan subsequent lines.
-                j = i + 1
-                value_found = None
-                while j < len(lines):
-                    try:
-                        candidate = lines[j].replace(",", "")
-                        value_candidate = float(candidate)
-                        value_found = value_candidate
-                        break
-                    except ValueError:
-                        j += 1
-                if value_found is not None:
-                    extracted_data[feature] = value_found
-                else:
-                    raise ValueError(f"Could not extract numeric value for {feature}")
-    
-    # --- Verify All Required Features ---
-    required_features = ['Hemoglobin', 'Leucocyte', 'Thrombocyte', 'Erythrocyte',
-                         'Hematocrit', 'Mcv', 'Mch', 'Mchc', 'Age', 'Sex']
-    for feat in required_features:
-        if feat not in extracted_data:
-            raise ValueError(f"Missing required feature: {feat}")
-    
-    # --- Process Sex Field ---
-    sex_val = extracted_data["Sex"]
-    if sex_val in ['1', '1.0']:
-        extracted_data["Sex"] = 'M'
-    elif sex_val in ['0', '0.0']:
-        extracted_data["Sex"] = 'F'
-    if extracted_data["Sex"] not in ['M', 'F']:
-        raise ValueError(f"Invalid value for Sex: {extracted_data['Sex']}. Must be M, F, 1, or 0")
-    
-    # Build the features list in the order required by the model.
-    features = [
-        extracted_data['Hematocrit'],
-        extracted_data['Hemoglobin'],
-        extracted_data['Erythrocyte'],
-        extracted_data['Leucocyte'],
-        extracted_data['Thrombocyte'],
-        extracted_data['Mch'],
-        extracted_data['Mchc'],
-        extracted_data['Mcv'],
-        extracted_data['Age'],
-        1 if extracted_data['Sex'] == 'M' else 0
-    ]
-    
-    return features, extracted_data
+    threshold = app.config['UPLOAD_SPILL_THRESHOLD']
+    data = stream.read(threshold + 1)
+    if len(data) <= threshold:
+        yield data
+        return
+
+    fd, filepath = tempfile.mkstemp(suffix='.pdf', dir=app.config['UPLOAD_FOLDER'])
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(data)
+            shutil.copyfileobj(stream, out)
+        yield filepath
+    finally:
+        if os.path.exists(filepath):
+            os.remove(filepath)
 
 def analyze_blood_report(features):
-    results = {
-        'conditions': [],
-        'findings': [],
-        'treatments': []
-    }
-    
-    if features['Hemoglobin'] < 12 and features['Hematocrit'] < 36:
-        if features['Mcv'] < 80:
-            results['conditions'].append("Microcytic Anemia")
-            results['findings'].append("Low hemoglobin, hematocrit, and MCV suggest iron deficiency anemia")
-            results['treatments'].extend([
-                "Prescribe iron supplements (ferrous sulfate 325mg oral daily)",
-                "Recommend dietary modifications to increase iron-rich foods",
-                "Schedule follow-up blood test in 3 months"
-            ])
-        elif features['Mcv'] > 100:
-            results['conditions'].append("Macrocytic Anemia")
-            results['findings'].append("Low hemoglobin with high MCV suggests vitamin B12 or folate deficiency")
-            results['treatments'].extend([
-                "Initiate vitamin B12 injections or oral supplementation",
-                "Begin folic acid supplementation",
-                "Provide dietary counseling for vitamin B12 and folate-rich foods"
-            ])
-        else:
-            results['conditions'].append("Normocytic Anemia")
-            results['findings'].append("Low hemoglobin and hematocrit with normal MCV may indicate acute blood loss or chronic disease")
-            results['treatments'].extend([
-                "Conduct further evaluation to determine underlying cause",
-                "Consider additional tests (iron studies, reticulocyte count, kidney function)"
-            ])
-    
-    if features['Leucocyte'] > 11:
-        results['conditions'].append("Leukocytosis")
-        results['findings'].append("Elevated white blood cell count indicates possible infection or inflammation")
-        results['treatments'].extend([
-            "Perform further testing to identify the source of infection",
-            "Order a CBC with differential",
-            "Consider initiating antibiotic therapy based on clinical findings"
-        ])
-    
-    if features['Thrombocyte'] > 450:
-        results['conditions'].append("Thrombocytosis")
-        results['findings'].append("High platelet count may be reactive or suggest a myeloproliferative disorder")
-        results['treatments'].extend([
-            "Repeat platelet count and check inflammatory markers",
-            "Evaluate for underlying causes; refer to hematology if persistent"
-        ])
-    
-    if features['Hematocrit'] > 52 and features['Hemoglobin'] > 18:
-        results['conditions'].append("Polycythemia")
-        results['findings'].append("Elevated hemoglobin and hematocrit may indicate polycythemia vera or secondary polycythemia")
-        results['treatments'].extend([
-            "Conduct JAK2 mutation analysis",
-            "Consider therapeutic phlebotomy",
-            "Evaluate need for cytoreductive therapy (e.g., hydroxyurea) in selected cases"
-        ])
-    
-    if features['Mchc'] < 32:
-        results['conditions'].append("Hypochromia")
-        results['findings'].append("Low MCHC indicates reduced hemoglobin content per cell, common in iron deficiency anemia")
-        results['treatments'].extend([
-            "Recommend iron supplementation",
-            "Advise dietary modifications to boost iron intake",
-            "Plan for follow-up evaluation of red cell indices"
-        ])
-    elif features['Mchc'] > 36:
-        results['conditions'].append("Hyperchromia")
-        results['findings'].append("Elevated MCHC is unusual and may be seen in conditions like hereditary spherocytosis")
-        results['treatments'].extend([
-            "Consider osmotic fragility testing",
-            "Refer to hematology for further evaluation"
-        ])
-    
-    if features['Age'] > 65:
-        results['findings'].append("Patient is elderly; consider age-related changes in blood parameters and higher risk for chronic conditions")
-    
-    return results
-
-def generate_report(analysis_results, feature_dict):
-    report = "BLOOD ANALYSIS REPORT\n\n"
-    
-    # For unhealthy patients (with conditions)
-    if analysis_results['conditions']:
-        report += "Status: <span class='text-danger'>Requires Medical Attention</span>\n\n"
-        
-        report += "Possible Conditions:\n"
-        # Add conditions with red highlighting
-        for condition in analysis_results['conditions']:
-            report += f"• <span class='text-danger'>{condition}</span>\n"
-        
-        report += "\nDetailed Analysis:\n"
-        # Add findings with specific highlighting for medical terms
-        for finding in analysis_results['findings']:
-            # Highlight specific medical terms and values
-            finding = finding.replace("Low ", "<span class='text-danger'>Low</span> ")
-            finding = finding.replace("High ", "<span class='text-danger'>High</span> ")
-            finding = finding.replace("Elevated ", "<span class='text-danger'>Elevated</span> ")
-            finding = finding.replace("hemoglobin", "<span class='text-danger'>hemoglobin</span>")
-            finding = finding.replace("hematocrit", "<span class='text-danger'>hematocrit</span>")
-            finding = finding.replace("MCV", "<span class='text-danger'>MCV</span>")
-            finding = finding.replace("MCHC", "<span class='text-danger'>MCHC</span>")
-            finding = finding.replace("white blood cell count", "<span class='text-danger'>white blood cell count</span>")
-            finding = finding.replace("platelet count", "<span class='text-danger'>platelet count</span>")
-            finding = finding.replace("infection", "<span class='text-danger'>infection</span>")
-            finding = finding.replace("inflammation", "<span class='text-danger'>inflammation</span>")
-            finding = finding.replace("iron deficiency", "<span class='text-danger'>iron deficiency</span>")
-            finding = finding.replace("vitamin B12", "<span class='text-danger'>vitamin B12</span>")
-            finding = finding.replace("folate deficiency", "<span class='text-danger'>folate deficiency</span>")
-            finding = finding.replace("acute blood loss", "<span class='text-danger'>acute blood loss</span>")
-            finding = finding.replace("chronic disease", "<span class='text-danger'>chronic disease</span>")
-            finding = finding.replace("myeloproliferative", "<span class='text-danger'>myeloproliferative</span>")
-            finding = finding.replace("polycythemia vera", "<span class='text-danger'>polycythemia vera</span>")
-            finding = finding.replace("secondary polycythemia", "<span class='text-danger'>secondary polycythemia</span>")
-            finding = finding.replace("hereditary spherocytosis", "<span class='text-danger'>hereditary spherocytosis</span>")
-            report += f"• {finding}\n"
-        
-        report += "\nRecommended Actions:\n"
-        # Add treatments with key medical terms highlighted
-        for treatment in analysis_results['treatments']:
-            # Highlight specific medical treatments and tests
-            treatment = treatment.replace("iron supplements", "<span class='text-danger'>iron supplements</span>")
-            treatment = treatment.replace("ferrous sulfate", "<span class='text-danger'>ferrous sulfate</span>")
-            treatment = treatment.replace("vitamin B12", "<span class='text-danger'>vitamin B12</span>")
-            treatment = treatment.replace("folic acid", "<span class='text-danger'>folic acid</span>")
-            treatment = treatment.replace("antibiotic therapy", "<span class='text-danger'>antibiotic therapy</span>")
-            treatment = treatment.replace("CBC", "<span class='text-danger'>CBC</span>")
-            treatment = treatment.replace("JAK2 mutation analysis", "<span class='text-danger'>JAK2 mutation analysis</span>")
-            treatment = treatment.replace("therapeutic phlebotomy", "<span class='text-danger'>therapeutic phlebotomy</span>")
-            treatment = treatment.replace("cytoreductive therapy", "<span class='text-danger'>cytoreductive therapy</span>")
-            treatment = treatment.replace("hydroxyurea", "<span class='text-danger'>hydroxyurea</span>")
-            treatment = treatment.replace("iron studies", "<span class='text-danger'>iron studies</span>")
-            treatment = treatment.replace("reticulocyte count", "<span class='text-danger'>reticulocyte count</span>")
-            treatment = treatment.replace("kidney function", "<span class='text-danger'>kidney function</span>")
-            treatment = treatment.replace("osmotic fragility testing", "<span class='text-danger'>osmotic fragility testing</span>")
-            treatment = treatment.replace("inflammatory markers", "<span class='text-danger'>inflammatory markers</span>")
-            report += f"• {treatment}\n"
-    
-    # For healthy patients (no conditions)
+    # The clinical rules live in rules.json; see rules.py for how the table is evaluated.
+    return rule_set.evaluate(features)
+
+MAX_BATCH_SIZE = 5000
+
+def wants_structured_report():
+    # ?report=structured adds the report as data ("report") next to the HTML text.
+    return request.args.get('report') == 'structured'
+
+def build_prediction_response(prediction, raw_feature_dict, structured=False, analysis=None):
+    # `analysis` may be passed in when it was computed for a whole batch at once.
+    if prediction == 0:
+        if analysis is None:
+            analysis = analyze_blood_report(raw_feature_dict)
     else:
-        report += "Status: <span class='text-success'>Healthy</span>\n\n"
-        report += "Possible Conditions:\n"
-        report += "• <span class='text-success'>All blood parameters are within normal ranges</span>\n\n"
-        report += "Recommendations:\n"
-        report += "• Maintain current health status\n"
-        report += "• Continue regular <span class='text-success'>exercise</span> and <span class='text-success'>balanced diet</span>\n"
-        report += "• Schedule routine follow-up in <span class='text-success'>12 months</span>\n"
-    
-    # Add a summary of blood parameters with highlighting for abnormal values
-    # report += "\nBlood Parameters:\n"
-    
-    # # Define normal ranges for highlighting
-    # normal_ranges = {
-    #     'Hemoglobin': {'min': 12, 'max': 18, 'unit': 'g/dL'},
-    #     'Hematocrit': {'min': 36, 'max': 52, 'unit': '%'},
-    #     'Erythrocyte': {'min': 4, 'max': 6, 'unit': 'M/µL'},
-    #     'Leucocyte': {'min': 4, 'max': 11, 'unit': 'K/µL'},
-    #     'Thrombocyte': {'min': 150, 'max': 450, 'unit': 'K/µL'},
-    #     'Mch': {'min': 27, 'max': 32, 'unit': 'pg'},
-    #     'Mchc': {'min': 32, 'max': 36, 'unit': 'g/dL'},
-    #     'Mcv': {'min': 80, 'max': 100, 'unit': 'fL'}
-    # }
-    
-    # Add each parameter with appropriate highlighting
-    # for param, range_info in normal_ranges.items():
-    #     value = feature_dict[param]
-    #     unit = range_info['unit']
-    #     normal_range = f"{range_info['min']}-{range_info['max']} {unit}"
-        
-    #     if value < range_info['min'] or value > range_info['max']:
-    #         # Abnormal value
-    #         value_str = f"<span class='text-danger'>{value} {unit}</span>"
-    #         if value < range_info['min']:
-    #             status = "<span class='text-danger'>(Low)</span>"
-    #         else:
-    #             status = "<span class='text-danger'>(High)</span>"
-    #     else:
-    #         # Normal value
-    #         value_str = f"{value} {unit}"
-    #         status = "<span class='text-success'>(Normal)</span>"
-            
-    #     report += f"• {param}: {value_str} {status} [Normal range: {normal_range}]\n"
-    
-    # Add patient info
-    report += f"\nPatient Info:\n"
-    report += f"• Age: {feature_dict['Age']} years\n"
-    report += f"• Sex: {feature_dict['Sex']}\n"
-    
-    return report
+        analysis = {"conditions": [], "findings": [], "treatments": []}
+    detailed_report = generate_report(analysis, raw_feature_dict)
+
+    response = {
+        "status": "success",
+        "prediction": "incare" if prediction == 0 else "outcare",
+        "detailed_analysis": detailed_report
+    }
+    if structured:
+        response["report"] = structured_report(analysis, raw_feature_dict)
+    return response
+
+def predict_records(raw_feature_dicts):
+    bundle = registry.get()
+    started = time.perf_counter()
+    predictions = bundle.predictor.predict(raw_feature_dicts)
+    shadow_scorer.submit(bundle, raw_feature_dicts, predictions, time.perf_counter() - started)
+    return predictions
+
+# Concurrent /predict_manual calls are scored together (see PREDICT_BATCH_WINDOW_MS).
+manual_batcher = MicroBatcher(predict_records)
+
+def score_pdf(bundle, source, structured=False, endpoint='predict'):
+    """
+    Extracts, scores and caches one PDF given as bytes or a path. Returns
+    (response, cache_hit); extraction errors propagate to the caller.
+    Each stage is timed into docassist_stage_seconds under `endpoint`.
+    """
+    with stage(endpoint, 'cache_lookup'):
+        cache_key = pdf_cache_key(source, bundle.version, "structured" if structured else "")
+        cached = result_cache.get(cache_key)
+    CACHE_LOOKUPS.inc(endpoint=endpoint, result='hit' if cached is not None else 'miss')
+    if cached is not None:
+        return cached, True
+
+    try:
+        if PDF_PRECHECK:
+            # Turns away non-PDFs, encrypted, oversized and scanned documents in milliseconds.
+            with stage(endpoint, 'precheck'):
+                precheck_pdf(source)
+        with stage(endpoint, 'extraction'):
+            features, extracted_values, extraction_stats = extraction_pool.extract(source)
+    except Exception as e:
+        EXTRACTION_FAILURES.inc(reason=failure_reason(e))
+        raise
+    # Measured inside the extraction worker: PDF open, lab template, page text layout and parsing.
+    observe_extraction(endpoint, extraction_stats)
+
+    with stage(endpoint, 'features'):
+        raw_feature_dict = build_raw_feature_dict(extracted_values)
+
+    timings = {}
+    prediction = bundle.predictor.predict_one(raw_feature_dict, timings)
+    observe_stages(endpoint, timings)
+    shadow_scorer.submit(bundle, [raw_feature_dict], [prediction], sum(timings.values()))
+    print("Extracted Features:", features)
+    print("Prediction:", prediction)
+
+    with stage(endpoint, 'report'):
+        response = build_prediction_response(prediction, raw_feature_dict, structured)
+    response["extraction"] = extraction_stats
+    with stage(endpoint, 'cache_store'):
+        result_cache.set(cache_key, response)
+    return response, False
+
+def run_prediction_job(payload, options):
+    bundle = registry.get()
+    if bundle is None:
+        raise RuntimeError("Model not loaded")
+    response, _ = score_pdf(bundle, payload, options.get('structured', False), endpoint='jobs')
+    return response
+
+# Background processing of PDFs submitted to /jobs. Extraction timeouts and crashed
+# extraction workers are retried; parse errors fail the job straight away.
+job_queue = JobQueue(run_prediction_job, transient_errors=(ExtractionError,))
+
+def cached_response(cached):
+    response = jsonify(cached)
+    response.headers['X-Cache'] = 'HIT'
+    return response
 
 @app.route('/predict', methods=['POST'])
 def predict():
@@ -365,128 +179,348 @@ def predict():
             return jsonify({"error": "No file selected"}), 400
         if not allowed_file(file.filename):
             return jsonify({"error": "Invalid file type"}), 400
-        if model is None:
+        bundle = registry.get()
+        if bundle is None:
             return jsonify({"error": "Model not loaded"}), 500
 
-        filename_uploaded = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename_uploaded)
-        file.save(filepath)
-
         try:
-            # Extract features using the new pdfplumber-based function.
-            features, extracted_values = extract_features_from_pdf(filepath)
-            
-            raw_feature_dict = {
-                'Hematocrit': float(extracted_values['Hematocrit']),
-                'Hemoglobin': float(extracted_values['Hemoglobin']),
-                'Erythrocyte': float(extracted_values['Erythrocyte']),
-                'Leucocyte': float(extracted_values['Leucocyte']),
-                'Thrombocyte': float(extracted_values['Thrombocyte']),
-                'Mch': float(extracted_values['Mch']),
-                'Mchc': float(extracted_values['Mchc']),
-                'Mcv': float(extracted_values['Mcv']),
-                'Age': float(extracted_values['Age']),
-                'Sex': extracted_values['Sex']
-            }
-
-            new_data = pd.DataFrame({
-                'HAEMATOCRIT': [raw_feature_dict['Hematocrit']],
-                'HAEMOGLOBINS': [raw_feature_dict['Hemoglobin']],
-                'ERYTHROCYTE': [raw_feature_dict['Erythrocyte']],
-                'LEUCOCYTE': [raw_feature_dict['Leucocyte']],
-                'THROMBOCYTE': [raw_feature_dict['Thrombocyte']],
-                'MCH': [raw_feature_dict['Mch']],
-                'MCHC': [raw_feature_dict['Mchc']],
-                'MCV': [raw_feature_dict['Mcv']],
-                'AGE': [raw_feature_dict['Age']],
-                'SEX': [raw_feature_dict['Sex']]
-            })
-
-            new_data_scaled = new_data.copy()
-            new_data_scaled['SEX'] = label_encoder_sex.transform(new_data_scaled['SEX'])
-            numeric_cols = ['HAEMATOCRIT', 'HAEMOGLOBINS', 'ERYTHROCYTE', 'LEUCOCYTE',
-                              'THROMBOCYTE', 'MCH', 'MCHC', 'MCV', 'AGE']
-            new_data_scaled[numeric_cols] = scaler.transform(new_data_scaled[numeric_cols])
-
-            prediction = model.predict(new_data_scaled)[0]
-            print("Extracted Features:", features)
-            print("Prediction:", prediction)
-
-            if prediction == 0:
-                analysis = analyze_blood_report(raw_feature_dict)
-                detailed_report = generate_report(analysis, raw_feature_dict)
-            else:
-                detailed_report = generate_report({"conditions": [], "findings": [], "treatments": []}, raw_feature_dict)
-
-            return jsonify({
-                "status": "success",
-                "prediction": "incare" if prediction == 0 else "outcare",
-                "detailed_analysis": detailed_report
-            })
+            # Extract features in the extraction worker pool, straight from the upload.
+            with ExitStack() as stack:
+                with stage('predict', 'upload'):
+                    source = stack.enter_context(upload_source(file.stream))
+                response, cache_hit = score_pdf(bundle, source, wants_structured_report())
+            if cache_hit:
+                return cached_response(response)
+            return jsonify(response)
 
         except Exception as e:
             print("Extraction/Predict Error:", str(e))
             return jsonify({"status": "error", "error": str(e)})
-        finally:
-            if os.path.exists(filepath):
-                os.remove(filepath)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+def score_manual(bundle, data, structured=False, endpoint='predict_manual'):
+    """
+    Scores and caches one record of /predict_manual values. Returns (response, cache_hit);
+    invalid records raise. Each stage is timed into docassist_stage_seconds under `endpoint`.
+    """
+    with stage(endpoint, 'features'):
+        raw_feature_dict = build_raw_feature_dict(data)
+
+    with stage(endpoint, 'cache_lookup'):
+        cache_key = features_cache_key(raw_feature_dict, bundle.version, "structured" if structured else "")
+        cached = result_cache.get(cache_key)
+    CACHE_LOOKUPS.inc(endpoint=endpoint, result='hit' if cached is not None else 'miss')
+    if cached is not None:
+        return cached, True
+
+    if manual_batcher.enabled:
+        # Includes the time spent waiting for the batch to fill.
+        with stage(endpoint, 'batched_model'):
+            prediction = manual_batcher.predict(raw_feature_dict)
+    else:
+        timings = {}
+        prediction = bundle.predictor.predict_one(raw_feature_dict, timings)
+        observe_stages(endpoint, timings)
+        shadow_scorer.submit(bundle, [raw_feature_dict], [prediction], sum(timings.values()))
+    print("Manual Prediction:", prediction)
+
+    with stage(endpoint, 'report'):
+        response = build_prediction_response(prediction, raw_feature_dict, structured)
+    with stage(endpoint, 'cache_store'):
+        result_cache.set(cache_key, response)
+    return response, False
+
 @app.route('/predict_manual', methods=['POST'])
 def predict_manual():
     try:
-        data = request.json
-        raw_feature_dict = {
-            'Hematocrit': float(data['Hematocrit']),
-            'Hemoglobin': float(data['Hemoglobin']),
-            'Erythrocyte': float(data['Erythrocyte']),
-            'Leucocyte': float(data['Leucocyte']),
-            'Thrombocyte': float(data['Thrombocyte']),
-            'Mch': float(data['Mch']),
-            'Mchc': float(data['Mchc']),
-            'Mcv': float(data['Mcv']),
-            'Age': float(data['Age']),
-            'Sex': data['Sex']
-        }
-
-        new_data = pd.DataFrame({
-            'HAEMATOCRIT': [raw_feature_dict['Hematocrit']],
-            'HAEMOGLOBINS': [raw_feature_dict['Hemoglobin']],
-            'ERYTHROCYTE': [raw_feature_dict['Erythrocyte']],
-            'LEUCOCYTE': [raw_feature_dict['Leucocyte']],
-            'THROMBOCYTE': [raw_feature_dict['Thrombocyte']],
-            'MCH': [raw_feature_dict['Mch']],
-            'MCHC': [raw_feature_dict['Mchc']],
-            'MCV': [raw_feature_dict['Mcv']],
-            'AGE': [raw_feature_dict['Age']],
-            'SEX': [raw_feature_dict['Sex']]
-        })
+        bundle = registry.get()
+        if bundle is None:
+            return jsonify({"error": "Model not loaded"}), 500
+        response, cache_hit = score_manual(bundle, request.json, wants_structured_report())
+        if cache_hit:
+            return cached_response(response)
+        return jsonify(response)
 
-        new_data_scaled = new_data.copy()
-        new_data_scaled['SEX'] = label_encoder_sex.transform(new_data_scaled['SEX'])
-        numeric_cols = ['HAEMATOCRIT', 'HAEMOGLOBINS', 'ERYTHROCYTE', 'LEUCOCYTE',
-                           'THROMBOCYTE', 'MCH', 'MCHC', 'MCV', 'AGE']
-        new_data_scaled[numeric_cols] = scaler.transform(new_data_scaled[numeric_cols])
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """
+    Scores many reports in one request. Accepts either a JSON array of records with the
+    same fields as /predict_manual, or a multipart upload of PDFs under the "files" key.
+    Results are returned in input order; a bad item gets its own error entry instead of
+    failing the whole batch.
+    """
+    try:
+        bundle = registry.get()
+        if bundle is None:
+            return jsonify({"error": "Model not loaded"}), 500
 
-        prediction = model.predict(new_data_scaled)[0]
-        print("Manual Prediction:", prediction)
+        files = request.files.getlist('files')
+        if files:
+            items = files
+        else:
+            items = request.get_json(silent=True)
+            if not isinstance(items, list):
+                return jsonify({"error": "Expected a JSON array of records or PDF files under 'files'"}), 400
 
-        if prediction == 0:
-            analysis = analyze_blood_report(raw_feature_dict)
-            detailed_report = generate_report(analysis, raw_feature_dict)
+        if not items:
+            return jsonify({"error": "Empty batch"}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Batch too large (max {MAX_BATCH_SIZE} items)"}), 400
+
+        results = [None] * len(items)
+        valid_indices = []
+        valid_records = []
+
+        if files:
+            with ExitStack() as stack:
+                sources = {}
+                for index, item in enumerate(items):
+                    if not allowed_file(item.filename):
+                        results[index] = {"status": "error", "error": "Invalid file type"}
+                        continue
+                    source = stack.enter_context(upload_source(item.stream))
+                    if PDF_PRECHECK:
+                        try:
+                            precheck_pdf(source)
+                        except PrecheckError as e:
+                            EXTRACTION_FAILURES.inc(reason=e.reason)
+                            results[index] = {"status": "error", "error": str(e)}
+                            continue
+                    sources[index] = source
+                extracted = dict(zip(sources, extraction_pool.extract_many(list(sources.values()))))
+            records = []
+            for index in sources:
+                if isinstance(extracted[index], Exception):
+                    EXTRACTION_FAILURES.inc(reason=failure_reason(extracted[index]))
+                    results[index] = {"status": "error", "error": str(extracted[index])}
+                else:
+                    observe_extraction('predict_batch', extracted[index][2])
+                    records.append((index, extracted[index][1]))
         else:
-            detailed_report = generate_report({"conditions": [], "findings": [], "treatments": []}, raw_feature_dict)
+            records = list(enumerate(items))
+
+        sex_classes = set(bundle.label_encoder_sex.classes_.tolist())
+        for index, item in records:
+            try:
+                # Same per-row checks as /predict_stream, so one bad record cannot fail the
+                # vectorized model call for the whole batch.
+                raw_feature_dict = validate_row(item, sex_classes)
+            except Exception as e:
+                results[index] = {"status": "error", "error": str(e)}
+                continue
+
+            valid_indices.append(index)
+            valid_records.append(raw_feature_dict)
+
+        if valid_records:
+            # One vectorized encoder/scaler/model pass over the stacked batch.
+            started = time.perf_counter()
+            predictions = bundle.predictor.predict(valid_records)
+            shadow_scorer.submit(bundle, valid_records, predictions, time.perf_counter() - started)
+            structured = wants_structured_report()
+            # Rules for all in-care records in one vectorized pass.
+            incare = [record for record, prediction in zip(valid_records, predictions) if prediction == 0]
+            analyses = iter(rule_set.analyze_batch(incare))
+            for index, raw_feature_dict, prediction in zip(valid_indices, valid_records, predictions):
+                analysis = next(analyses) if prediction == 0 else None
+                results[index] = build_prediction_response(prediction, raw_feature_dict, structured, analysis)
+                if files:
+                    results[index]["extraction"] = extracted[index][2]
+
+        print(f"Batch Prediction: {len(valid_records)}/{len(items)} records scored")
 
         return jsonify({
             "status": "success",
-            "prediction": "incare" if prediction == 0 else "outcare",
-            "detailed_analysis": detailed_report
+            "count": len(results),
+            "results": results
         })
 
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@app.route('/predict_stream', methods=['POST'])
+def predict_stream():
+    """
+    Scores a CSV or NDJSON body of /predict_manual records (format from ?format= or the
+    Content-Type) and streams back one NDJSON result per row, then a summary line.
+    """
+    input_format = request.args.get('format') or detect_format(content_type=request.content_type)
+    if input_format not in ('csv', 'ndjson'):
+        return jsonify({"error": "Send CSV or NDJSON (set ?format=csv|ndjson or the Content-Type)"}), 400
+    bundle = registry.get()
+    if bundle is None:
+        return jsonify({"error": "Model not loaded"}), 500
+
+    request.max_content_length = STREAM_MAX_CONTENT_LENGTH
+    text_stream = io.TextIOWrapper(request.stream, encoding='utf-8', errors='replace', newline='')
+    rows = read_rows(text_stream, input_format)
+    return Response(stream_with_context(stream_ndjson(rows, bundle, observe=shadow_scorer.submit)),
+                    mimetype='application/x-ndjson')
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queues a PDF (`file` field) for background scoring and returns its job id at once.
+    An optional `callback_url` form field, on a host listed in JOB_CALLBACK_HOSTS,
+    receives the finished job as a JSON POST.
+    """
+    try:
+        if 'file' not in request.files:
+            return jsonify({"error": "No file provided"}), 400
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({"error": "No file selected"}), 400
+        if not allowed_file(file.filename):
+            return jsonify({"error": "Invalid file type"}), 400
+        callback_url = request.form.get('callback_url') or None
+        if callback_url:
+            try:
+                check_callback_url(callback_url, job_queue.callback_hosts)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        if registry.get() is None:
+            return jsonify({"error": "Model not loaded"}), 500
+
+        payload = file.read()
+        if PDF_PRECHECK:
+            try:
+                precheck_pdf(payload)
+            except PrecheckError as e:
+                EXTRACTION_FAILURES.inc(reason=e.reason)
+                return jsonify({"error": str(e), "reason": e.reason}), 400
+
+        try:
+            job_id = job_queue.submit(payload, {"structured": wants_structured_report()}, callback_url)
+        except QueueFull as e:
+            response = jsonify({"error": str(e)})
+            response.headers['Retry-After'] = str(job_queue.retry_after)
+            return response, 503
+
+        status_url = url_for('job_status', job_id=job_id)
+        response = jsonify({"id": job_id, "status": "queued", "status_url": status_url})
+        response.headers['Location'] = status_url
+        return response, 202
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/jobs/stats', methods=['GET'])
+def job_stats():
+    return jsonify(job_queue.stats())
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    # Also resumes processing of jobs left queued by a previous run of this process.
+    job_queue.start()
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({**result_cache.stats(), "model_version": registry.version})
+
+@app.route('/batcher/stats', methods=['GET'])
+def batcher_stats():
+    return jsonify(manual_batcher.stats())
+
+@app.route('/startup', methods=['GET'])
+def startup():
+    return jsonify(registry.startup_report())
+
+@app.route('/models', methods=['GET'])
+def models():
+    """The served and shadow model versions, the published ones and the shadow comparison."""
+    return jsonify({**registry.describe(), "shadow_scoring": shadow_scorer.stats()})
+
+@app.route('/models/reload', methods=['POST'])
+def reload_models():
+    """
+    Hot-reloads the model versions in this process. An optional JSON body
+    {"version": name, "shadow": name or null} first points models/CURRENT and
+    models/SHADOW at them, so the other workers follow within MODEL_RELOAD_INTERVAL.
+    Requires `Authorization: Bearer <MODEL_ADMIN_TOKEN>`.
+    """
+    if not MODEL_ADMIN_TOKEN:
+        return jsonify({"error": "Model reloads over HTTP are disabled (MODEL_ADMIN_TOKEN is not set)"}), 403
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.strip().encode(), MODEL_ADMIN_TOKEN.encode()):
+        return jsonify({"error": "Invalid or missing admin token"}), 401
+    data = request.get_json(silent=True) or {}
+    previous = {pointer: registry.read_pointer(pointer) for pointer in (CURRENT_POINTER, SHADOW_POINTER)}
+    try:
+        if 'version' in data:
+            registry.write_pointer(CURRENT_POINTER, data['version'])
+        if 'shadow' in data:
+            registry.write_pointer(SHADOW_POINTER, data['shadow'])
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        registry.reload()
+    except Exception as e:
+        # Point the other workers back at the versions that are still being served.
+        for pointer, name in previous.items():
+            registry.write_pointer(pointer, name)
+        return jsonify({"error": f"Could not load the model: {e}"}), 500
+    return jsonify(registry.describe())
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def collect_component_stats():
+    # Read at scrape time from the components' own stats.
+    gauges = [("docassist_process_pid", "Process id of the worker that served this scrape.",
+               {(): os.getpid()}, ())]
+    gauges += stats_gauges("docassist_result_cache", "Result cache statistic", result_cache.stats())
+    gauges += stats_gauges("docassist_micro_batcher", "Micro-batcher statistic", manual_batcher.stats())
+    gauges += stats_gauges("docassist_extraction_pool", "Extraction pool statistic", extraction_pool.stats())
+    gauges += stats_gauges("docassist_shadow", "Shadow scoring statistic", shadow_scorer.stats())
+    gauges += [("docassist_model_reloads", "Model versions hot-reloaded by this process.",
+                {(): registry.reloads}, ())]
+    if os.path.exists(job_queue.path):
+        gauges += stats_gauges("docassist_jobs", "Background job statistic", job_queue.stats())
+    return gauges
+
+metrics.register_collector(collect_component_stats)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # ?profile=1 samples this request's stack when PROFILER_ENABLED=1.
+    if PROFILER_ENABLED and request.args.get('profile') == '1':
+        g.profiler = SamplingProfiler().start()
+
+@app.after_request
+def record_request(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or 'unknown'
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+    # Only the first request of the process is recorded; it pays for any lazy loading.
+    if 'first_request' not in registry.timings:
+        registry.record('first_request', elapsed)
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        path = profiler.write(endpoint)
+        print(f"Profile of {request.path} ({profiler.samples} samples):", path)
+        response.headers['X-Profile'] = os.path.basename(path)
+        response.headers['X-Profile-Samples'] = str(profiler.samples)
+    return response
+
+registry.record('app_import', time.perf_counter() - _import_started)
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,279 @@
+"""
+ASGI serving mode:
+    uvicorn asgi:app --port 5000 --workers 2
+
+/predict and /predict_manual are served natively with the same request and response
+contracts as the Flask app. Request bodies are received on the event loop, so a slow
+upload ties up no thread until it has fully arrived. Only then is the CPU-bound part
+(extraction, which mostly waits on the extraction pool, and inference plus the report)
+handed to one of two bounded thread pools. Each pool admits as many requests as it has
+threads plus ASGI_MAX_QUEUE waiting ones; beyond that the request is answered at once
+with 503 and a Retry-After header instead of queueing without bound.
+
+Every other route is the Flask app itself, mounted through a2wsgi. The native routes send
+the same CORS headers as flask_cors and answer oversized bodies and malformed JSON with the
+same 400 JSON errors as the Flask routes.
+
+    python -m benchmarks.load_test    # this server against gunicorn under slow uploads
+"""
+import os
+import json
+import time
+import asyncio
+import threading
+from contextlib import ExitStack, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.datastructures import Headers
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge, UnsupportedMediaType
+
+from app import app as flask_app, registry, job_queue, allowed_file, upload_source, score_pdf, score_manual
+from extraction_pool import extraction_pool
+from metrics import metrics, stage, stats_gauges, REQUESTS, REQUEST_SECONDS, ADMISSION_REJECTIONS
+
+# Threads running /predict requests once their upload has arrived (default: one per
+# extraction process, as each of them mostly waits for the extraction pool).
+ASGI_PDF_THREADS = int(os.environ.get('ASGI_PDF_THREADS', max(extraction_pool.workers, 2)))
+# Threads scoring /predict_manual requests.
+ASGI_MANUAL_THREADS = int(os.environ.get('ASGI_MANUAL_THREADS', 4))
+# Requests allowed to wait for a busy pool before new ones get 503.
+ASGI_MAX_QUEUE = int(os.environ.get('ASGI_MAX_QUEUE', 32))
+# Retry-After, in seconds, sent with those 503 responses.
+ASGI_RETRY_AFTER = int(os.environ.get('ASGI_RETRY_AFTER', 1))
+# Request body limit of /predict and /predict_manual, as in the Flask app.
+MAX_CONTENT_LENGTH = flask_app.config['MAX_CONTENT_LENGTH']
+# Threads serving the mounted Flask routes.
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 10))
+
+
+class Saturated(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """
+    A thread pool that admits at most `threads + max_queue` calls at a time; run() raises
+    Saturated beyond that. A call stays admitted until its thread finishes, even if the
+    client that made it has gone away.
+    """
+
+    def __init__(self, name, threads, max_queue=ASGI_MAX_QUEUE):
+        self.name = name
+        self.threads = threads
+        self.limit = threads + max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+
+        self.pending = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.max_pending_seen = 0
+
+    def _release(self, _):
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.pending >= self.limit:
+                self.rejected += 1
+                ADMISSION_REJECTIONS.inc(executor=self.name)
+                raise Saturated(f"Server busy ({self.pending} {self.name} requests in progress)")
+            self.pending += 1
+            self.admitted += 1
+            self.max_pending_seen = max(self.max_pending_seen, self.pending)
+            if self._executor is None:
+                # Created on first use, in the serving process.
+                self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix=f'asgi-{self.name}')
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "threads": self.threads,
+                "limit": self.limit,
+                "pending": self.pending,
+                "max_pending_seen": self.max_pending_seen,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+
+class BodyLimit:
+    """
+    Raises werkzeug's RequestEntityTooLarge from `receive` once a request body exceeds
+    `max_body_size`, so the handler answers it the way the Flask routes do (400 with the
+    error's message) instead of with Starlette's plain-text 413.
+    """
+
+    def __init__(self, app, max_body_size):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        declared = Headers(scope=scope).get('content-length', '')
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            if declared.isdigit() and int(declared) > self.max_body_size:
+                raise RequestEntityTooLarge()
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_body_size:
+                    raise RequestEntityTooLarge()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def request_json(request, body):
+    """`body` parsed as Flask's request.json does it, raising the same werkzeug errors."""
+    mimetype = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    if not (mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))):
+        raise UnsupportedMediaType("Did not attempt to load JSON data because the request "
+                                   "Content-Type was not 'application/json'.")
+    try:
+        return json.loads(body)
+    except ValueError:
+        raise BadRequest() from None
+
+
+pdf_executor = BoundedExecutor('pdf', ASGI_PDF_THREADS)
+manual_executor = BoundedExecutor('manual', ASGI_MANUAL_THREADS)
+
+
+def busy_response(error):
+    return JSONResponse({"error": str(error)}, status_code=503, headers={'Retry-After': str(ASGI_RETRY_AFTER)})
+
+
+def json_response(response, cache_hit):
+    return JSONResponse(response, headers={'X-Cache': 'HIT'} if cache_hit else None)
+
+
+def wants_structured_report(request):
+    return request.query_params.get('report') == 'structured'
+
+
+def timed_endpoint(endpoint):
+    """Records the handler's requests and latency like the Flask app's after_request hook."""
+    def decorator(handler):
+        async def wrapper(request):
+            started = time.perf_counter()
+            response = await handler(request)
+            elapsed = time.perf_counter() - started
+            REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+            REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+            if 'first_request' not in registry.timings:
+                registry.record('first_request', elapsed)
+            return response
+        return wrapper
+    return decorator
+
+
+def score_upload(bundle, file, structured):
+    # Runs in pdf_executor: the form parser spooled the upload, to disk if it is large.
+    with ExitStack() as stack:
+        with stage('predict', 'upload'):
+            source = stack.enter_context(upload_source(file))
+        return score_pdf(bundle, source, structured)
+
+
+@timed_endpoint('predict')
+async def predict(request):
+    form = None
+    try:
+        form = await request.form(max_files=1)
+        file = form.get('file')
+        if file is None or (isinstance(file, str) and file):
+            return JSONResponse({"error": "No file provided"}, status_code=400)
+        # An empty file input (filename="") is parsed as an empty text field.
+        if isinstance(file, str) or not file.filename:
+            return JSONResponse({"error": "No file selected"}, status_code=400)
+        if not allowed_file(file.filename):
+            return JSONResponse({"error": "Invalid file type"}, status_code=400)
+        bundle = registry.get()
+        if bundle is None:
+            return JSONResponse({"error": "Model not loaded"}, status_code=500)
+
+        try:
+            response, cache_hit = await pdf_executor.run(score_upload, bundle, file.file,
+                                                         wants_structured_report(request))
+            return json_response(response, cache_hit)
+        except Saturated as e:
+            return busy_response(e)
+        except Exception as e:
+            print("Extraction/Predict Error:", str(e))
+            return JSONResponse({"status": "error", "error": str(e)})
+
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    finally:
+        if form is not None:
+            await form.close()
+
+
+@timed_endpoint('predict_manual')
+async def predict_manual(request):
+    try:
+        bundle = registry.get()
+        if bundle is None:
+            return JSONResponse({"error": "Model not loaded"}, status_code=500)
+        data = request_json(request, await request.body())
+        response, cache_hit = await manual_executor.run(score_manual, bundle, data,
+                                                        wants_structured_report(request))
+        return json_response(response, cache_hit)
+    except Saturated as e:
+        return busy_response(e)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+
+def collect_executor_stats():
+    return (stats_gauges("docassist_asgi_pdf_executor", "ASGI /predict executor statistic", pdf_executor.stats())
+            + stats_gauges("docassist_asgi_manual_executor", "ASGI /predict_manual executor statistic",
+                           manual_executor.stats()))
+
+
+@asynccontextmanager
+async def lifespan(_):
+    # What gunicorn.conf.py does for each gunicorn worker.
+    registry.warm_up()
+    job_queue.start()
+    yield
+    pdf_executor.shutdown()
+    manual_executor.shutdown()
+
+
+metrics.register_collector(collect_executor_stats)
+
+# What the Flask app's CORS(app) sends: the request's Origin echoed back, whatever it is.
+# Preflight requests are answered by the mounted Flask app.
+native_middleware = [
+    Middleware(CORSMiddleware, allow_origin_regex='.*', allow_methods=['*'], allow_headers=['*']),
+    Middleware(BodyLimit, max_body_size=MAX_CONTENT_LENGTH),
+]
+
+app = Starlette(
+    routes=[
+        Route('/predict', predict, methods=['POST'], middleware=native_middleware),
+        Route('/predict_manual', predict_manual, methods=['POST'], middleware=native_middleware),
+        Mount('/', app=WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS)),
+    ],
+    lifespan=lifespan,
+)
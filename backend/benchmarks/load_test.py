@@ -0,0 +1,215 @@
+"""
+Load test of the sync (gunicorn) and ASGI (uvicorn asgi:app) servers with slow clients.
+
+Run from the backend directory:
+    python -m benchmarks.load_test [--clients 32] [--fast-clients 8] [--duration 20] [--upload-seconds 2]
+    python -m benchmarks.load_test --servers asgi --scenarios uploads --upload-seconds 0
+
+Each server is started on its own port with the result cache off, then each scenario
+runs for `--duration` seconds with clients sending requests back to back:
+    uploads  `--clients` clients upload the sample PDFs to /predict, each upload trickled
+             over `--upload-seconds` like a client on a slow link
+    manual   `--fast-clients` clients send /predict_manual values at full speed
+    mixed    both at once: how fast requests fare while slow uploads hold the server's
+             workers, which is where a server that blocks a worker per upload loses out
+Requests answered 503 by admission control are counted apart from errors, and the client
+waits for Retry-After before its next request.
+
+The client is plain asyncio, so it adds no dependency and can hold many slow uploads open.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import uuid
+import signal
+import asyncio
+import argparse
+import subprocess
+import statistics
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SAMPLES_DIR = os.path.join(BACKEND_DIR, '..', 'blood reports')
+SERVERS = {
+    # The current production setup (gunicorn.conf.py: WEB_CONCURRENCY workers with
+    # GUNICORN_THREADS threads each) and the ASGI mode with the same number of processes.
+    'sync': lambda port, workers: ['gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}', '--workers', str(workers)],
+    'asgi': lambda port, workers: ['uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+                                   '--workers', str(workers), '--log-level', 'warning', '--no-access-log'],
+}
+ENDPOINTS = ['predict', 'predict_manual']
+SCENARIOS = ['uploads', 'manual', 'mixed']
+
+
+def multipart_body(name, content):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def request_bodies(endpoint):
+    """(body, content type) pairs the clients cycle through."""
+    paths = sorted(glob.glob(os.path.join(SAMPLES_DIR, '*.pdf')))
+    if endpoint == 'predict':
+        bodies = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                bodies.append(multipart_body(os.path.basename(path), f.read()))
+        return bodies
+
+    sys.path.insert(0, BACKEND_DIR)
+    from pdf_extraction import extract_features_from_pdf
+    return [(json.dumps(extract_features_from_pdf(path)[1]).encode(), 'application/json') for path in paths]
+
+
+async def send_request(port, path, body, content_type, upload_seconds, chunks):
+    """(status, retry_after) of one POST whose body is sent in `chunks` pieces over `upload_seconds`."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write((f'POST {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nContent-Type: {content_type}\r\n'
+                      f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n').encode())
+        size = -(-len(body) // chunks)
+        for start in range(0, len(body), size):
+            writer.write(body[start:start + size])
+            await writer.drain()
+            if upload_seconds > 0 and start + size < len(body):
+                await asyncio.sleep(upload_seconds / chunks)
+        response = await reader.read()
+    finally:
+        writer.close()
+    head = response.split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+    headers = dict(line.split(': ', 1) for line in head[1:] if ': ' in line)
+    retry_after = next((value for name, value in headers.items() if name.lower() == 'retry-after'), None)
+    return int(head[0].split()[1]), float(retry_after) if retry_after else None
+
+
+async def run_client(port, endpoint, bodies, index, deadline, upload_seconds, chunks, record):
+    """Sends requests back to back until `deadline`; `record(status, seconds)` gets each outcome."""
+    position = index
+    while time.perf_counter() < deadline:
+        body, content_type = bodies[position % len(bodies)]
+        position += 1
+        started = time.perf_counter()
+        try:
+            status, retry_after = await send_request(port, f'/{endpoint}', body, content_type,
+                                                     upload_seconds, chunks)
+        except (OSError, ValueError, IndexError):
+            record(None, 0.0)
+            await asyncio.sleep(0.1)
+            continue
+        record(status, time.perf_counter() - started)
+        if status == 503:
+            await asyncio.sleep(retry_after or 1)
+
+
+async def run_load(port, groups, duration, chunks):
+    """
+    Runs every group of clients at the same time. `groups` maps a name to (endpoint,
+    bodies, clients, upload seconds); returns the throughput and latency of each group.
+    """
+    deadline = time.perf_counter() + duration
+    outcomes = {name: ([], {}) for name in groups}
+
+    def recorder(name):
+        latencies, statuses = outcomes[name]
+
+        def record(status, seconds):
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(seconds)
+        return record
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_client(port, endpoint, bodies, index, deadline, upload_seconds, chunks, recorder(name))
+                           for name, (endpoint, bodies, clients, upload_seconds) in groups.items()
+                           for index in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for name, (latencies, statuses) in outcomes.items():
+        latencies.sort()
+        results[name] = {
+            "ok": statuses.get(200, 0),
+            "rejected_503": statuses.get(503, 0),
+            "other_status": {str(status): count for status, count in statuses.items()
+                             if status not in (200, 503, None)},
+            "connection_errors": statuses.get(None, 0),
+            "throughput_rps": round(statuses.get(200, 0) / elapsed, 2),
+            "p50_ms": round(statistics.median(latencies) * 1e3, 1) if latencies else None,
+            "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1e3, 1) if latencies else None,
+        }
+    return results
+
+
+def wait_until_ready(process, port, timeout=120):
+    import urllib.request
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server on port {port} exited with {process.returncode}")
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/startup', timeout=1):
+                return
+        except OSError:
+            time.sleep(0.25)
+    raise SystemExit(f"Server on port {port} did not start within {timeout}s")
+
+
+def scenarios(args, bodies):
+    """name -> client groups for run_load()."""
+    slow = ('predict', bodies['predict'], args.clients, args.upload_seconds)
+    fast = ('predict_manual', bodies['predict_manual'], args.fast_clients, 0)
+    return {
+        'uploads': {'slow /predict': slow},
+        'manual': {'fast /predict_manual': fast},
+        'mixed': {'slow /predict': slow, 'fast /predict_manual': fast},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', 2)),
+                        help="server processes (default: WEB_CONCURRENCY or 2)")
+    parser.add_argument('--clients', type=int, default=32, help="concurrent clients uploading PDFs")
+    parser.add_argument('--fast-clients', type=int, default=8, help="concurrent /predict_manual clients")
+    parser.add_argument('--duration', type=float, default=20, help="seconds per scenario")
+    parser.add_argument('--upload-seconds', type=float, default=2, help="time taken to send each PDF upload")
+    parser.add_argument('--chunks', type=int, default=20, help="pieces each upload is sent in")
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--output', help="also write the results as JSON")
+    args = parser.parse_args()
+
+    bodies = {endpoint: request_bodies(endpoint) for endpoint in ENDPOINTS}
+    env = dict(os.environ, RESULT_CACHE_SIZE='0', PYTHONWARNINGS='ignore')
+    results = {}
+    for offset, server in enumerate(args.servers):
+        port = args.port + offset
+        process = subprocess.Popen(SERVERS[server](port, args.workers), cwd=BACKEND_DIR, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        try:
+            wait_until_ready(process, port)
+            for scenario in args.scenarios:
+                groups = scenarios(args, bodies)[scenario]
+                for name, result in asyncio.run(run_load(port, groups, args.duration, args.chunks)).items():
+                    results[f"{server}.{scenario}.{name}"] = result
+                    print(f"{server:5} {scenario:8} {name:22} {result['throughput_rps']:8.2f} req/s  "
+                          f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  ok {result['ok']}  "
+                          f"503 {result['rejected_503']}  other {result['other_status']}  "
+                          f"connection errors {result['connection_errors']}", flush=True)
+        finally:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait()
+
+    meta = {key: value for key, value in vars(args).items() if key != 'output'}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
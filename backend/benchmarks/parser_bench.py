@@ -0,0 +1,131 @@
+"""
+Micro-benchmark of the CBC line parser against the original nested-loop scan.
+
+Run from the backend directory:
+    python -m benchmarks.parser_bench [--repeat 2000]
+
+The PDF text of every sample in `blood reports/` is extracted once up front, so only
+the line parsing is timed. A synthetic long report (CBC table after many lines of other
+panels) shows how the two parsers scale with document length.
+"""
+import os
+import re
+import glob
+import time
+import argparse
+
+import pdfplumber
+
+from pdf_extraction import parse_report_text
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'blood reports')
+
+
+def legacy_parse_text(text):
+    """The original extract_features_from_pdf text parsing, kept for comparison."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    extracted_data = {}
+    for line in lines:
+        if line.startswith("Age:"):
+            age_match = re.search(r"Age:\s*(\d+(\.\d+)?)", line)
+            if age_match:
+                extracted_data["Age"] = float(age_match.group(1))
+        if line.startswith("Sex:"):
+            sex_match = re.search(r"Sex:\s*([MF])", line, re.IGNORECASE)
+            if sex_match:
+                extracted_data["Sex"] = sex_match.group(1).upper()
+    cbc_mappings = {
+        'Hemoglobin': "Hemoglobin",
+        'Leucocyte': "Total Leukocyte Count",
+        'Thrombocyte': "Platelet Count",
+        'Erythrocyte': "Total RBC Count",
+        'Hematocrit': "Hematocrit Value, Hct",
+        'Mcv': "Mean Corpuscular Volume, MCV",
+        'Mch': "Mean Cell Haemoglobin, MCH",
+        'Mchc': "Mean Cell Haemoglobin CON, MCHC"
+    }
+    start_index = None
+    for i, line in enumerate(lines):
+        if "COMPLETE BLOOD COUNT" in line.upper():
+            start_index = i
+            break
+    if start_index is None:
+        raise ValueError("Could not locate CBC section in the report.")
+    table_start = None
+    for i in range(start_index, len(lines)):
+        if "TEST" in lines[i].upper():
+            table_start = i
+            break
+    if table_start is None:
+        raise ValueError("Could not locate CBC table header in the report.")
+    for i in range(table_start + 1, len(lines)):
+        line = lines[i]
+        for feature, indicator in cbc_mappings.items():
+            if indicator.upper() in line.upper():
+                number_match = re.search(r"(\d+(\.\d+)?)", line)
+                if number_match:
+                    extracted_data[feature] = float(number_match.group(1))
+                    continue
+                j = i + 1
+                value_found = None
+                while j < len(lines):
+                    try:
+                        value_found = float(lines[j].replace(",", ""))
+                        break
+                    except ValueError:
+                        j += 1
+                if value_found is not None:
+                    extracted_data[feature] = value_found
+                else:
+                    raise ValueError(f"Could not extract numeric value for {feature}")
+    return extracted_data
+
+
+def load_sample_texts():
+    samples = {}
+    for path in sorted(glob.glob(os.path.join(SAMPLES_DIR, '*.pdf'))):
+        with pdfplumber.open(path) as pdf:
+            samples[os.path.basename(path)] = "\n".join(page.extract_text() or "" for page in pdf.pages)
+    return samples
+
+
+def synthetic_long_report(sample_text, filler_lines=2000):
+    """A sample report with a long run of other panels before and after the CBC table."""
+    filler = "\n".join(f"Serum Analyte {i} {i % 97}.{i % 10} mg/dl" for i in range(filler_lines))
+    return "\n".join([filler, sample_text, filler])
+
+
+def best_time(func, text, repeat):
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func(text)
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    samples = load_sample_texts()
+    if not samples:
+        raise SystemExit(f"No sample PDFs found in {SAMPLES_DIR}")
+    first = next(iter(samples.values()))
+    samples['synthetic (2000 + 2000 filler lines)'] = synthetic_long_report(first)
+
+    print(f"{'report':45} {'legacy µs':>12} {'single-pass µs':>15} {'speedup':>8}")
+    for name, text in samples.items():
+        repeat = args.repeat if len(text) < 10000 else max(args.repeat // 100, 5)
+        _, extracted = parse_report_text(text)
+        legacy = legacy_parse_text(text)
+        assert all(legacy[key] == value for key, value in extracted.items()), name
+        legacy_time = best_time(legacy_parse_text, text, repeat)
+        new_time = best_time(parse_report_text, text, repeat)
+        print(f"{name:45} {legacy_time * 1e6:12.1f} {new_time * 1e6:15.1f} {legacy_time / new_time:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Micro-benchmark of the report renderer against the original generate_report.
+
+Run from the backend directory:
+    python -m benchmarks.report_bench [--records 2000]
+
+Analyses are produced by analyze_blood_report for random records, so every combination
+of conditions the app can report is rendered; both renderers must give identical text.
+"""
+import time
+import argparse
+
+from app import analyze_blood_report
+from inference import random_records
+from report_renderer import FINDING_TERMS, generate_report, highlight_finding
+
+
+def legacy_generate_report(analysis_results, feature_dict):
+    """The original generate_report (chained str.replace and +=), kept for comparison."""
+    report = "BLOOD ANALYSIS REPORT\n\n"
+    
+    # For unhealthy patients (with conditions)
+    if analysis_results['conditions']:
+        report += "Status: <span class='text-danger'>Requires Medical Attention</span>\n\n"
+        
+        report += "Possible Conditions:\n"
+        # Add conditions with red highlighting
+        for condition in analysis_results['conditions']:
+            report += f"• <span class='text-danger'>{condition}</span>\n"
+        
+        report += "\nDetailed Analysis:\n"
+        # Add findings with specific highlighting for medical terms
+        for finding in analysis_results['findings']:
+            # Highlight specific medical terms and values
+            finding = finding.replace("Low ", "<span class='text-danger'>Low</span> ")
+            finding = finding.replace("High ", "<span class='text-danger'>High</span> ")
+            finding = finding.replace("Elevated ", "<span class='text-danger'>Elevated</span> ")
+            finding = finding.replace("hemoglobin", "<span class='text-danger'>hemoglobin</span>")
+            finding = finding.replace("hematocrit", "<span class='text-danger'>hematocrit</span>")
+            finding = finding.replace("MCV", "<span class='text-danger'>MCV</span>")
+            finding = finding.replace("MCHC", "<span class='text-danger'>MCHC</span>")
+            finding = finding.replace("white blood cell count", "<span class='text-danger'>white blood cell count</span>")
+            finding = finding.replace("platelet count", "<span class='text-danger'>platelet count</span>")
+            finding = finding.replace("infection", "<span class='text-danger'>infection</span>")
+            finding = finding.replace("inflammation", "<span class='text-danger'>inflammation</span>")
+            finding = finding.replace("iron deficiency", "<span class='text-danger'>iron deficiency</span>")
+            finding = finding.replace("vitamin B12", "<span class='text-danger'>vitamin B12</span>")
+            finding = finding.replace("folate deficiency", "<span class='text-danger'>folate deficiency</span>")
+            finding = finding.replace("acute blood loss", "<span class='text-danger'>acute blood loss</span>")
+            finding = finding.replace("chronic disease", "<span class='text-danger'>chronic disease</span>")
+            finding = finding.replace("myeloproliferative", "<span class='text-danger'>myeloproliferative</span>")
+            finding = finding.replace("polycythemia vera", "<span class='text-danger'>polycythemia vera</span>")
+            finding = finding.replace("secondary polycythemia", "<span class='text-danger'>secondary polycythemia</span>")
+            finding = finding.replace("hereditary spherocytosis", "<span class='text-danger'>hereditary spherocytosis</span>")
+            report += f"• {finding}\n"
+        
+        report += "\nRecommended Actions:\n"
+        # Add treatments with key medical terms highlighted
+        for treatment in analysis_results['treatments']:
+            # Highlight specific medical treatments and tests
+            treatment = treatment.replace("iron supplements", "<span class='text-danger'>iron supplements</span>")
+            treatment = treatment.replace("ferrous sulfate", "<span class='text-danger'>ferrous sulfate</span>")
+            treatment = treatment.replace("vitamin B12", "<span class='text-danger'>vitamin B12</span>")
+            treatment = treatment.replace("folic acid", "<span class='text-danger'>folic acid</span>")
+            treatment = treatment.replace("antibiotic therapy", "<span class='text-danger'>antibiotic therapy</span>")
+            treatment = treatment.replace("CBC", "<span class='text-danger'>CBC</span>")
+            treatment = treatment.replace("JAK2 mutation analysis", "<span class='text-danger'>JAK2 mutation analysis</span>")
+            treatment = treatment.replace("therapeutic phlebotomy", "<span class='text-danger'>therapeutic phlebotomy</span>")
+            treatment = treatment.replace("cytoreductive therapy", "<span class='text-danger'>cytoreductive therapy</span>")
+            treatment = treatment.replace("hydroxyurea", "<span class='text-danger'>hydroxyurea</span>")
+            treatment = treatment.replace("iron studies", "<span class='text-danger'>iron studies</span>")
+            treatment = treatment.replace("reticulocyte count", "<span class='text-danger'>reticulocyte count</span>")
+            treatment = treatment.replace("kidney function", "<span class='text-danger'>kidney function</span>")
+            treatment = treatment.replace("osmotic fragility testing", "<span class='text-danger'>osmotic fragility testing</span>")
+            treatment = treatment.replace("inflammatory markers", "<span class='text-danger'>inflammatory markers</span>")
+            report += f"• {treatment}\n"
+    
+    # For healthy patients (no conditions)
+    else:
+        report += "Status: <span class='text-success'>Healthy</span>\n\n"
+        report += "Possible Conditions:\n"
+        report += "• <span class='text-success'>All blood parameters are within normal ranges</span>\n\n"
+        report += "Recommendations:\n"
+        report += "• Maintain current health status\n"
+        report += "• Continue regular <span class='text-success'>exercise</span> and <span class='text-success'>balanced diet</span>\n"
+        report += "• Schedule routine follow-up in <span class='text-success'>12 months</span>\n"
+    
+    # Add patient info
+    report += f"\nPatient Info:\n"
+    report += f"• Age: {feature_dict['Age']} years\n"
+    report += f"• Sex: {feature_dict['Sex']}\n"
+    
+    return report
+
+
+def best_time(func, cases, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for analysis, record in cases:
+            func(analysis, record)
+        best = min(best, (time.perf_counter() - start) / len(cases))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=2000)
+    args = parser.parse_args()
+
+    records = random_records(args.records)
+    cases = [(analyze_blood_report(record), record) for record in records]
+    cases += [({"conditions": [], "findings": [], "treatments": []}, record) for record in records[:100]]
+    for analysis, record in cases:
+        assert generate_report(analysis, record) == legacy_generate_report(analysis, record), analysis
+    # Texts where highlight terms overlap must still match the sequential replacements.
+    for text in ["secondary polycythemia vera", "Low MCHC and MCV; High hemoglobin", " ".join(FINDING_TERMS)]:
+        expected = legacy_generate_report({"conditions": ["x"], "findings": [text], "treatments": []}, records[0])
+        assert f"• {highlight_finding(text)}\n" in expected, text
+
+    legacy = best_time(legacy_generate_report, cases)
+    new = best_time(generate_report, cases)
+    print(f"{len(cases)} reports, all identical")
+    print(f"legacy: {legacy * 1e6:8.1f} µs/report")
+    print(f"   new: {new * 1e6:8.1f} µs/report ({legacy / new:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Micro-benchmark of the rule table (rules.json) against the original if-chain analyzer.
+
+Run from the backend directory:
+    python -m benchmarks.rules_bench [--records 100000]
+
+Random records plus records sitting exactly on every threshold (and NaN) must give the
+same analysis from the legacy code, RuleSet.evaluate and RuleSet.analyze_batch.
+"""
+import time
+import argparse
+import itertools
+
+from inference import random_records
+from rules import rule_set
+
+
+def legacy_analyze_blood_report(features):
+    """The original analyze_blood_report (a chain of if statements), kept for comparison."""
+    results = {
+        'conditions': [],
+        'findings': [],
+        'treatments': []
+    }
+    
+    if features['Hemoglobin'] < 12 and features['Hematocrit'] < 36:
+        if features['Mcv'] < 80:
+            results['conditions'].append("Microcytic Anemia")
+            results['findings'].append("Low hemoglobin, hematocrit, and MCV suggest iron deficiency anemia")
+            results['treatments'].extend([
+                "Prescribe iron supplements (ferrous sulfate 325mg oral daily)",
+                "Recommend dietary modifications to increase iron-rich foods",
+                "Schedule follow-up blood test in 3 months"
+            ])
+        elif features['Mcv'] > 100:
+            results['conditions'].append("Macrocytic Anemia")
+            results['findings'].append("Low hemoglobin with high MCV suggests vitamin B12 or folate deficiency")
+            results['treatments'].extend([
+                "Initiate vitamin B12 injections or oral supplementation",
+                "Begin folic acid supplementation",
+                "Provide dietary counseling for vitamin B12 and folate-rich foods"
+            ])
+        else:
+            results['conditions'].append("Normocytic Anemia")
+            results['findings'].append("Low hemoglobin and hematocrit with normal MCV may indicate acute blood loss or chronic disease")
+            results['treatments'].extend([
+                "Conduct further evaluation to determine underlying cause",
+                "Consider additional tests (iron studies, reticulocyte count, kidney function)"
+            ])
+    
+    if features['Leucocyte'] > 11:
+        results['conditions'].append("Leukocytosis")
+        results['findings'].append("Elevated white blood cell count indicates possible infection or inflammation")
+        results['treatments'].extend([
+            "Perform further testing to identify the source of infection",
+            "Order a CBC with differential",
+            "Consider initiating antibiotic therapy based on clinical findings"
+        ])
+    
+    if features['Thrombocyte'] > 450:
+        results['conditions'].append("Thrombocytosis")
+        results['findings'].append("High platelet count may be reactive or suggest a myeloproliferative disorder")
+        results['treatments'].extend([
+            "Repeat platelet count and check inflammatory markers",
+            "Evaluate for underlying causes; refer to hematology if persistent"
+        ])
+    
+    if features['Hematocrit'] > 52 and features['Hemoglobin'] > 18:
+        results['conditions'].append("Polycythemia")
+        results['findings'].append("Elevated hemoglobin and hematocrit may indicate polycythemia vera or secondary polycythemia")
+        results['treatments'].extend([
+            "Conduct JAK2 mutation analysis",
+            "Consider therapeutic phlebotomy",
+            "Evaluate need for cytoreductive therapy (e.g., hydroxyurea) in selected cases"
+        ])
+    
+    if features['Mchc'] < 32:
+        results['conditions'].append("Hypochromia")
+        results['findings'].append("Low MCHC indicates reduced hemoglobin content per cell, common in iron deficiency anemia")
+        results['treatments'].extend([
+            "Recommend iron supplementation",
+            "Advise dietary modifications to boost iron intake",
+            "Plan for follow-up evaluation of red cell indices"
+        ])
+    elif features['Mchc'] > 36:
+        results['conditions'].append("Hyperchromia")
+        results['findings'].append("Elevated MCHC is unusual and may be seen in conditions like hereditary spherocytosis")
+        results['treatments'].extend([
+            "Consider osmotic fragility testing",
+            "Refer to hematology for further evaluation"
+        ])
+    
+    if features['Age'] > 65:
+        results['findings'].append("Patient is elderly; consider age-related changes in blood parameters and higher risk for chronic conditions")
+    
+    return results
+
+
+def boundary_records():
+    """Every combination of values at, just below and just above the thresholds."""
+    thresholds = {}
+    for group in rule_set.groups:
+        for feature, _, threshold in group.when + tuple(c for b in group.branches for c in b.when):
+            thresholds.setdefault(feature, set()).update(
+                {threshold - 0.01, threshold, threshold + 0.01, float('nan')})
+    features = sorted(thresholds)
+    return [dict(zip(features, values), Sex='M')
+            for values in itertools.product(*(sorted(thresholds[f], key=str) for f in features))]
+
+
+def as_lists(analysis):
+    """An analyze_batch() analysis (tuples) in the list form evaluate() returns."""
+    return {key: list(values) for key, values in analysis.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=100000)
+    args = parser.parse_args()
+
+    records = random_records(args.records) + boundary_records()
+    expected = [legacy_analyze_blood_report(record) for record in records]
+    assert [rule_set.evaluate(record) for record in records] == expected
+    assert [as_lists(analysis) for analysis in rule_set.analyze_batch(records)] == expected
+
+    start = time.perf_counter()
+    for record in records:
+        legacy_analyze_blood_report(record)
+    legacy = time.perf_counter() - start
+    start = time.perf_counter()
+    for record in records:
+        rule_set.evaluate(record)
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    fired = rule_set.evaluate_batch(records)
+    matrix = time.perf_counter() - start
+    start = time.perf_counter()
+    rule_set.analyses(fired)
+    lists = time.perf_counter() - start
+
+    print(f"{len(records)} records, all identical")
+    print(f"          legacy: {legacy / len(records) * 1e6:8.2f} µs/record")
+    print(f"        evaluate: {single / len(records) * 1e6:8.2f} µs/record")
+    print(f"  evaluate_batch: {matrix / len(records) * 1e6:8.2f} µs/record (matrix only)")
+    print(f"  + analyses():   {(matrix + lists) / len(records) * 1e6:8.2f} µs/record")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+"""
+Benchmark suite for the backend: per-stage latency, /predict throughput and peak RSS.
+
+Run from the backend directory:
+    python -m benchmarks.suite [--quick] [--output benchmarks/results.json]
+    python -m benchmarks.suite --save-baseline     # record benchmarks/baseline.json
+    python -m benchmarks.suite --compare           # compare with it; exits 1 on a regression
+
+Inputs are the sample PDFs in `blood reports/`, synthetic CBC PDFs (benchmarks/synthetic_pdf.py)
+and random feature rows, all generated from fixed seeds so runs are comparable. The result
+cache is disabled while measuring so every request does the full work.
+
+Results are written as JSON: {"meta": {...}, "metrics": {name: {"value", "unit", "better"}}}.
+Compare runs on the same machine only; a metric regresses when it is worse than the
+baseline by more than --tolerance (default 20%).
+"""
+import io
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import platform
+import resource
+import statistics
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+
+import pdfplumber
+
+from benchmarks.synthetic_pdf import cbc_report_pdf, expected_values, synthetic_reports
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLES_DIR = os.path.join(BENCHMARKS_DIR, '..', '..', 'blood reports')
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+RESULTS_PATH = os.path.join(BENCHMARKS_DIR, 'results.json')
+CONCURRENCY_LEVELS = [1, 2, 4, 8]
+
+
+class Results:
+    def __init__(self, out=sys.stdout):
+        self.metrics = {}
+        # The app logs every prediction with print(); the suite silences stdout while it
+        # runs and reports through the stream it was given.
+        self.out = out
+
+    def section(self, title):
+        print(title, file=self.out, flush=True)
+
+    def add(self, name, value, unit, better='lower'):
+        self.metrics[name] = {"value": round(value, 6), "unit": unit, "better": better}
+        print(f"  {name:55} {value:14.3f} {unit}", file=self.out, flush=True)
+
+    def add_latencies(self, name, seconds, unit='ms'):
+        scale = 1e3 if unit == 'ms' else 1e6
+        self.add(f"{name}.p50", statistics.median(seconds) * scale, unit)
+        self.add(f"{name}.p95", percentile(seconds, 95) * scale, unit)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def sample_pdfs():
+    paths = sorted(glob.glob(os.path.join(SAMPLES_DIR, '*.pdf')))
+    if not paths:
+        raise SystemExit(f"No sample PDFs found in {SAMPLES_DIR}")
+    pdfs = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            pdfs.append(f.read())
+    return pdfs
+
+
+def bench_extraction(results, args):
+    """pdfplumber text layout and line parsing, measured in this process (no worker pool)."""
+    from pdf_extraction import extract_features_with_stats, parse_report_text
+
+    results.section("extraction")
+    documents = {
+        "samples": sample_pdfs(),
+        "synthetic_1_page": [pdf for _, pdf in synthetic_reports(args.documents, seed=1)],
+        # Every page has to be read before the CBC table turns up.
+        "synthetic_cbc_after_5_pages": [pdf for _, pdf in synthetic_reports(
+            max(args.documents // 4, 2), seed=2, filler_pages_before=5)],
+        # The CBC table is on page 1, so the early stop skips the other 20 pages.
+        "synthetic_20_trailing_pages": [pdf for _, pdf in synthetic_reports(
+            max(args.documents // 4, 2), seed=3, filler_pages_after=20)],
+    }
+    for name, pdfs in documents.items():
+        totals, template_times, text_times, parse_times, hits = [], [], [], [], 0
+        for _ in range(args.repeat):
+            for pdf in pdfs:
+                started = time.perf_counter()
+                _, _, stats = extract_features_with_stats(pdf)
+                totals.append(time.perf_counter() - started)
+                template_times.append(stats["timings"]["template"])
+                text_times.append(stats["timings"]["pdf_open"] + stats["timings"]["pdf_text"])
+                parse_times.append(stats["timings"]["parse"])
+                hits += stats["template_result"] == "hit"
+        results.add_latencies(f"extraction.{name}.total", totals)
+        # Reports read by a lab template spend their time here instead of in pdf_text/parse.
+        results.add_latencies(f"extraction.{name}.template", template_times)
+        results.add_latencies(f"extraction.{name}.pdf_text", text_times)
+        results.add_latencies(f"extraction.{name}.parse", parse_times, unit='us')
+        results.add(f"extraction.{name}.template_hit_rate", hits / len(totals), "ratio", better='higher')
+
+    from pdf_precheck import precheck_pdf
+    results.add_latencies("precheck.samples",
+                          [timed(precheck_pdf, pdf) for _ in range(args.repeat * 20) for pdf in documents["samples"]],
+                          unit='us')
+
+    # Extraction must still read the synthetic values back exactly.
+    record, pdf = next(synthetic_reports(1, seed=4))
+    _, extracted, _ = extract_features_with_stats(pdf)
+    assert all(extracted[key] == value for key, value in expected_values(record).items())
+
+    texts = []
+    for pdf in documents["samples"]:
+        with pdfplumber.open(io.BytesIO(pdf)) as document:
+            texts.append("\n".join(page.extract_text() or "" for page in document.pages))
+    results.add_latencies("parse_report_text.samples",
+                          [timed(parse_report_text, text) for _ in range(args.repeat * 50) for text in texts],
+                          unit='us')
+
+
+def bench_inference(results, args, bundle):
+    from inference import random_records
+
+    results.section("inference")
+    records = random_records(args.rows, seed=5)
+    predictor = bundle.predictor
+    results.add_latencies("inference.predict_one",
+                          [timed(predictor.predict_one, record) for record in records[:2000]], unit='us')
+    elapsed = min(timed(predictor.predict, records) for _ in range(3))
+    results.add("inference.predict_batch.rows_per_second", len(records) / elapsed, "rows/s", better='higher')
+
+
+def bench_report(results, args):
+    from app import analyze_blood_report, build_prediction_response
+    from inference import random_records
+    from report_renderer import generate_report
+
+    results.section("report")
+    records = random_records(2000, seed=6)
+    analyses = [(analyze_blood_report(record), record) for record in records]
+    results.add_latencies("report.analyze_blood_report",
+                          [timed(analyze_blood_report, record) for record in records], unit='us')
+    results.add_latencies("report.generate_report",
+                          [timed(generate_report, analysis, record) for analysis, record in analyses], unit='us')
+    results.add_latencies("report.build_prediction_response",
+                          [timed(build_prediction_response, 0, record) for record in records], unit='us')
+
+
+def bench_bulk(results, args, bundle):
+    from bulk_score import stream_ndjson
+    from inference import random_records
+
+    results.section("bulk scoring")
+    rows = random_records(args.rows, seed=7)
+    started = time.perf_counter()
+    for _ in stream_ndjson(iter(rows), bundle):
+        pass
+    results.add("bulk_score.rows_per_second", len(rows) / (time.perf_counter() - started),
+                "rows/s", better='higher')
+
+
+def run_concurrent(client_factory, send, payloads, concurrency):
+    """Sends every payload with `concurrency` threads; returns (elapsed, per-request seconds)."""
+    def worker(chunk):
+        client = client_factory()
+        latencies = []
+        for payload in chunk:
+            started = time.perf_counter()
+            response = send(client, payload)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200 and response.get_json().get("status") == "success", \
+                response.get_json()
+        return latencies
+
+    chunks = [payloads[i::concurrency] for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = [latency for chunk in executor.map(worker, chunks) for latency in chunk]
+    return time.perf_counter() - started, latencies
+
+
+def bench_throughput(results, args):
+    """End-to-end requests through the Flask test client (extraction pool included)."""
+    import app
+    from inference import random_records
+
+    results.section("throughput")
+    records = random_records(args.requests, seed=8)
+    pdfs = [cbc_report_pdf(record, index) for index, record in enumerate(records)]
+
+    def send_pdf(client, pdf):
+        return client.post('/predict', data={'file': (io.BytesIO(pdf), 'report.pdf')})
+
+    def send_record(client, record):
+        return client.post('/predict_manual', json=record)
+
+    # Warm up the extraction workers and the model before timing.
+    run_concurrent(app.app.test_client, send_pdf, pdfs[:4], 1)
+    for concurrency in args.concurrency:
+        elapsed, latencies = run_concurrent(app.app.test_client, send_pdf, pdfs, concurrency)
+        results.add(f"throughput.predict.c{concurrency}.requests_per_second", len(pdfs) / elapsed,
+                    "req/s", better='higher')
+        results.add_latencies(f"throughput.predict.c{concurrency}.latency", latencies)
+
+        elapsed, latencies = run_concurrent(app.app.test_client, send_record, records, concurrency)
+        results.add(f"throughput.predict_manual.c{concurrency}.requests_per_second", len(records) / elapsed,
+                    "req/s", better='higher')
+        results.add_latencies(f"throughput.predict_manual.c{concurrency}.latency", latencies)
+
+
+def compare(current, baseline, tolerance):
+    """Prints the change of every metric against the baseline; returns the regressed names."""
+    regressions = []
+    print(f"\n{'metric':60} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, metric in current.items():
+        base = baseline.get(name)
+        if base is None or not base["value"]:
+            continue
+        change = (metric["value"] - base["value"]) / base["value"]
+        worse = change > tolerance if metric["better"] == 'lower' else change < -tolerance
+        flag = "  REGRESSION" if worse else ""
+        print(f"{name:60} {base['value']:12.3f} {metric['value']:12.3f} {change * 100:7.1f}%{flag}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="fewer documents, rows and requests")
+    parser.add_argument('--output', default=RESULTS_PATH, help="where to write the JSON results")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="also save the results as the baseline")
+    parser.add_argument('--compare', action='store_true', help="compare with the baseline; exit 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=CONCURRENCY_LEVELS)
+    args = parser.parse_args()
+    args.repeat = 1 if args.quick else 3
+    args.documents = 8 if args.quick else 40
+    args.rows = 5000 if args.quick else 50000
+    args.requests = 24 if args.quick else 120
+
+    import warnings
+    warnings.filterwarnings('ignore')
+    from model_registry import registry
+    from result_cache import result_cache
+
+    bundle = registry.get()
+    if bundle is None:
+        raise SystemExit("Model not loaded")
+    result_cache.max_entries = 0
+
+    results = Results()
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        bench_extraction(results, args)
+        bench_inference(results, args, bundle)
+        bench_report(results, args)
+        bench_bulk(results, args, bundle)
+        bench_throughput(results, args)
+    results.add("peak_rss.main_process", peak_rss_mb(), "MB")
+    results.add("peak_rss.extraction_workers", peak_rss_mb(resource.RUSAGE_CHILDREN), "MB")
+
+    output = {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "duration_seconds": round(time.perf_counter() - started, 1),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model_version": bundle.version,
+            "quick": args.quick,
+        },
+        "metrics": results.metrics,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            raise SystemExit(f"No baseline at {args.baseline}; run with --save-baseline first")
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("quick") != args.quick:
+            print("Warning: baseline and current run use different --quick settings")
+        regressions = compare(results.metrics, baseline["metrics"], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Minimal PDF writer for synthetic CBC reports, laid out like the samples in `blood reports/`
+(US Letter, one text line per row, the CBC table under "COMPLETE BLOOD COUNT (CBC)").
+
+It writes the PDF objects by hand with the standard Helvetica font, so the benchmarks
+need no PDF library beyond the pdfplumber the backend already uses to read them back.
+"""
+from inference import NUMERIC_FIELDS, random_records
+from pdf_extraction import CBC_MAPPINGS
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+LINE_HEIGHT = 16
+TOP_MARGIN = 72
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * TOP_MARGIN) // LINE_HEIGHT
+
+UNITS = {
+    'Hemoglobin': "g/dl",
+    'Leucocyte': "cells/mm3",
+    'Thrombocyte': "lakhs/cells/mm3",
+    'Erythrocyte': "million/cells/mm3",
+    'Hematocrit': "%",
+    'Mcv': "fL",
+    'Mch': "Pg",
+    'Mchc': "%",
+}
+# Labels as printed on the sample reports, which add the cell type to two of them.
+PRINTED_LABELS = dict(CBC_MAPPINGS, Thrombocyte="Platelet Count (Thrombocyte)",
+                      Erythrocyte="Total RBC Count (Erythrocyte)")
+
+
+def format_value(value):
+    return f"{value:g}"
+
+
+def report_lines(record, index=0):
+    """Text lines of a report as (x, text) runs per line."""
+    lines = [
+        [(20, f"Patient Name: Synthetic {index}"), (324, "Referred By: Benchmark")],
+        [(20, f"Age: {format_value(record['Age'])}"), (324, "Date: 01/01/2024")],
+        [(20, f"Sex: {record['Sex']}")],
+        [(20, f"Patient ID: SYN-{index:06d}")],
+        [(20, "COMPLETE BLOOD COUNT (CBC)")],
+        [(20, "TEST"), (300, "VALUE"), (420, "UNIT")],
+    ]
+    for feature in CBC_MAPPINGS:
+        lines.append([(20, PRINTED_LABELS[feature]), (300, format_value(record[feature])),
+                      (420, UNITS[feature])])
+    lines.append([(20, "~~~ End of report ~~~")])
+    return lines
+
+
+def filler_lines(count, start=0):
+    return [[(20, f"Serum Analyte {i}"), (300, f"{i % 97}.{i % 10}"), (420, "mg/dl")]
+            for i in range(start, start + count)]
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _content_stream(lines):
+    parts = ["BT", "/F1 11 Tf"]
+    for row, runs in enumerate(lines):
+        y = PAGE_HEIGHT - TOP_MARGIN - row * LINE_HEIGHT
+        for x, text in runs:
+            parts.append(f"1 0 0 1 {x} {y} Tm ({_escape(text)}) Tj")
+    parts.append("ET")
+    return "\n".join(parts).encode('latin-1')
+
+
+def build_pdf(pages):
+    """PDF bytes for a list of pages, each a list of lines of (x, text) runs."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_ids = []
+    for lines in pages:
+        stream = _content_stream(lines)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))
+        )
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def cbc_report_pdf(record, index=0, filler_pages_before=0, filler_pages_after=0):
+    """
+    A synthetic CBC report for `record`. Filler pages of other panels before the CBC page
+    make every page be read; filler pages after it are skipped by the early stop.
+    """
+    pages = [filler_lines(LINES_PER_PAGE, page * LINES_PER_PAGE) for page in range(filler_pages_before)]
+    pages.append(report_lines(record, index))
+    pages += [filler_lines(LINES_PER_PAGE, page * LINES_PER_PAGE) for page in range(filler_pages_after)]
+    return build_pdf(pages)
+
+
+def synthetic_reports(count, seed=0, **layout):
+    """(record, pdf bytes) pairs for `count` random records."""
+    for index, record in enumerate(random_records(count, seed)):
+        yield record, cbc_report_pdf(record, index, **layout)
+
+
+def expected_values(record):
+    """The values extraction should return for a synthetic report of `record`."""
+    return {field: float(format_value(record[field])) for field in NUMERIC_FIELDS}
@@ -0,0 +1,234 @@
+"""
+Streaming bulk scorer for CSV or NDJSON rows with the fields /predict_manual expects.
+
+Rows are read lazily, scored in fixed-size chunks with one vectorized model call each,
+and written out as NDJSON one result per input row, in input order. Only one chunk is
+held in memory at a time, and rows over BULK_MAX_ROW_LENGTH characters are skipped as
+errors without being read whole, so memory use does not grow with the size of the input. A
+final {"summary": ...} line reports the row counts and throughput in rows per second.
+
+Run from the backend directory:
+    python bulk_score.py archive.csv -o scores.ndjson [--chunk-size 1000]
+    cat archive.ndjson | python bulk_score.py - --format ndjson > scores.ndjson
+
+The same scorer backs the POST /predict_stream endpoint.
+"""
+import io
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+from itertools import islice
+
+from inference import build_raw_feature_dict
+
+# Rows scored together in one model call.
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 1000))
+# Longest input row (and CSV field) in characters. A longer row is reported as an error and
+# skipped without ever being held in memory whole.
+BULK_MAX_ROW_LENGTH = int(os.environ.get('BULK_MAX_ROW_LENGTH', 64 * 1024))
+
+FORMATS = ['csv', 'ndjson']
+
+
+def detect_format(name=None, content_type=None):
+    """Input format from a file name or content type; None when neither says."""
+    hint = f"{name or ''} {content_type or ''}".lower()
+    if 'json' in hint:
+        return 'ndjson'
+    if 'csv' in hint:
+        return 'csv'
+    return None
+
+
+# What errors='replace' decodes invalid UTF-8 bytes to.
+_REPLACEMENT_CHARACTER = '\ufffd'
+
+
+class RowTooLong(ValueError):
+    pass
+
+
+class _BoundedLines:
+    """
+    The lines of a text stream, reading at most `limit` characters of each. An over-long
+    line is read past to its end and raises RowTooLong; iteration can go on after that.
+    """
+
+    def __init__(self, text_stream, limit):
+        self._stream = text_stream
+        self._limit = limit
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self._stream.readline(self._limit + 1)
+        if not line:
+            raise StopIteration
+        if len(line) > self._limit and line[-1] not in '\r\n':
+            chunk = line
+            while chunk and chunk[-1] not in '\r\n':
+                chunk = self._stream.readline(self._limit)
+            raise RowTooLong(f"Row is longer than {self._limit} characters")
+        return line
+
+
+def read_rows(text_stream, input_format, max_row_length=BULK_MAX_ROW_LENGTH):
+    """
+    Yields one dict per input row; a row that cannot be used is yielded as the exception.
+    Rows longer than `max_row_length` characters are reported without being read whole.
+    The stream should decode with errors='replace': a row with bytes that are not valid
+    UTF-8 is then reported on its own instead of ending the whole stream.
+    """
+    lines = _BoundedLines(text_stream, max_row_length)
+    if input_format == 'csv':
+        # Also bounds a quoted field spanning several lines.
+        csv.field_size_limit(max_row_length)
+        reader = csv.DictReader(lines)
+        try:
+            reader.fieldnames
+        except (RowTooLong, csv.Error) as e:
+            yield ValueError(f"Invalid CSV header: {e}")
+            return
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except (RowTooLong, csv.Error) as e:
+                yield ValueError(str(e))
+                continue
+            if any(isinstance(value, str) and _REPLACEMENT_CHARACTER in value for value in row.values()):
+                yield ValueError("Row is not valid UTF-8")
+            else:
+                yield row
+    while True:
+        try:
+            line = next(lines)
+        except StopIteration:
+            return
+        except RowTooLong as e:
+            yield ValueError(str(e))
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        if _REPLACEMENT_CHARACTER in line:
+            yield ValueError("Row is not valid UTF-8")
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"Invalid JSON: {e}")
+
+
+def validate_row(row, sex_classes):
+    """The raw feature record for a row, or raises with the message reported for it."""
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError("Record must be a JSON object")
+    try:
+        raw_feature_dict = build_raw_feature_dict(row)
+    except KeyError as e:
+        raise ValueError(f"Missing required feature: {e.args[0]}") from None
+    # Checked as a string first: a list such as ["F"] is not hashable, and in a NumPy
+    # array of classes it would be compared element by element and pass.
+    if not isinstance(raw_feature_dict['Sex'], str) or raw_feature_dict['Sex'] not in sex_classes:
+        raise ValueError(f"Invalid value for Sex: {raw_feature_dict['Sex']}. Must be M or F")
+    return raw_feature_dict
+
+
+def score_rows(rows, bundle, chunk_size=BULK_CHUNK_SIZE, stats=None, observe=None):
+    """
+    Yields one result dict per row of `rows`. Rows that carry an "id" field get it echoed
+    back. `stats`, if given, is updated with the running row/scored/error counts, and
+    `observe(bundle, records, predictions, seconds)` is called after each model call.
+    """
+    stats = stats if stats is not None else {}
+    stats.update(rows=0, scored=0, errors=0)
+    sex_classes = set(bundle.label_encoder_sex.classes_.tolist())
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        results = []
+        valid_positions = []
+        valid_records = []
+        for row in chunk:
+            result = {"row": stats['rows']}
+            if isinstance(row, dict) and 'id' in row:
+                result["id"] = row['id']
+            try:
+                valid_records.append(validate_row(row, sex_classes))
+                valid_positions.append(len(results))
+            except Exception as e:
+                result.update(status="error", error=str(e))
+            results.append(result)
+            stats['rows'] += 1
+
+        if valid_records:
+            started = time.perf_counter()
+            predictions = bundle.predictor.predict(valid_records)
+            if observe is not None:
+                observe(bundle, valid_records, predictions, time.perf_counter() - started)
+            for position, prediction in zip(valid_positions, predictions):
+                results[position].update(status="success",
+                                         prediction="incare" if prediction == 0 else "outcare")
+        stats['scored'] += len(valid_records)
+        stats['errors'] += len(chunk) - len(valid_records)
+        yield from results
+
+
+def stream_ndjson(rows, bundle, chunk_size=BULK_CHUNK_SIZE, observe=None):
+    """NDJSON lines for score_rows(rows), followed by a summary line with the throughput."""
+    started = time.perf_counter()
+    stats = {}
+    for result in score_rows(rows, bundle, chunk_size, stats, observe):
+        yield json.dumps(result) + "\n"
+    elapsed = time.perf_counter() - started
+    summary = dict(stats, seconds=round(elapsed, 3),
+                   rows_per_second=round(stats['rows'] / elapsed, 1) if elapsed > 0 else 0.0)
+    yield json.dumps({"summary": summary}) + "\n"
+
+
+def main():
+    import warnings
+    from model_registry import registry
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('input', help="CSV or NDJSON file, or - for stdin")
+    parser.add_argument('-o', '--output', help="NDJSON output file (default: stdout)")
+    parser.add_argument('--format', choices=FORMATS, help="input format (default: from the file name)")
+    parser.add_argument('--chunk-size', type=int, default=BULK_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    input_format = args.format or detect_format(args.input)
+    if input_format is None:
+        raise SystemExit("Cannot tell the input format from the file name; pass --format")
+
+    warnings.filterwarnings('ignore')
+    bundle = registry.get()
+    if bundle is None:
+        raise SystemExit("Model not loaded")
+
+    source = (io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', errors='replace', newline='')
+              if args.input == '-' else open(args.input, encoding='utf-8', errors='replace', newline=''))
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for line in stream_ndjson(read_rows(source, input_format), bundle, args.chunk_size):
+            output.write(line)
+        # The summary is the last line written; repeat it on stderr for the operator.
+        print(line.strip(), file=sys.stderr)
+    finally:
+        source.close()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
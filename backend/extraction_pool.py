@@ -0,0 +1,218 @@
+import os
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+from pdf_extraction import extract_features_with_stats
+
+# Number of extraction processes (0 runs extraction inline in the request thread).
+EXTRACTION_WORKERS = int(os.environ.get('EXTRACTION_WORKERS', os.cpu_count() or 1))
+# Each worker process is replaced after this many documents to cap pdfplumber memory growth.
+EXTRACTION_MAX_TASKS_PER_CHILD = int(os.environ.get('EXTRACTION_MAX_TASKS_PER_CHILD', 50))
+# Seconds a single document may spend in extraction, counted from when a worker starts
+# it, before it is abandoned.
+EXTRACTION_TIMEOUT = float(os.environ.get('EXTRACTION_TIMEOUT', 30))
+# Seconds a freshly spawned worker may take to import pdfplumber and report ready.
+EXTRACTION_STARTUP_TIMEOUT = float(os.environ.get('EXTRACTION_STARTUP_TIMEOUT', 60))
+
+
+class ExtractionError(Exception):
+    """Extraction failed for reasons outside the document's content (`reason`: timeout or worker_crash)."""
+
+    def __init__(self, message, reason='other'):
+        super().__init__(message)
+        self.reason = reason
+
+    def __reduce__(self):
+        return self.__class__, (self.args[0], self.reason)
+
+
+def _worker_main(conn):
+    # Runs in the worker process: reports ready once pdf_extraction is imported, then
+    # extracts one document per message until the pool closes the pipe.
+    conn.send(None)
+    while True:
+        try:
+            source = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            result = (True, extract_features_with_stats(source))
+        except Exception as e:
+            result = (False, e)
+        try:
+            conn.send(result)
+        except Exception as e:
+            # The document's exception could not be pickled; send its message instead.
+            conn.send((False, RuntimeError(str(result[1]) if not result[0] else str(e))))
+
+
+class _Worker:
+    """One extraction process and the pipe it receives documents on."""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), name='pdf-extraction',
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.tasks = 0
+
+    def stop(self, kill=False):
+        self.conn.close()
+        if kill:
+            self.process.kill()
+
+        def reap():
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+
+        threading.Thread(target=reap, daemon=True).start()
+
+
+class ExtractionPool:
+    """
+    Runs extract_features_with_stats in worker processes so pdfplumber parsing does not
+    block the request thread and multi-file uploads can use every core.
+
+    Each worker process takes one document at a time over its own pipe, so the pool
+    knows which process runs which document and since when. The timeout is counted from
+    when a worker starts a document, not while it waits for a free worker, and a document
+    that exceeds it or crashes its worker only fails itself: that one process is killed
+    and replaced, and documents running in the other workers are not affected.
+    """
+
+    def __init__(self, workers=EXTRACTION_WORKERS, max_tasks_per_child=EXTRACTION_MAX_TASKS_PER_CHILD,
+                 timeout=EXTRACTION_TIMEOUT, startup_timeout=EXTRACTION_STARTUP_TIMEOUT):
+        self.workers = workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        # Spawned workers only import pdf_extraction, not the Flask app, and we avoid
+        # forking a process that already runs XGBoost threads.
+        self._context = multiprocessing.get_context('spawn')
+        self._idle = []
+        self._all = set()
+        self._starting = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._stats_lock = threading.Lock()
+
+        self.submissions = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self.replaced = 0
+
+    def _acquire(self):
+        """An idle worker, spawning one if the pool is not full; waits for one otherwise."""
+        with self._available:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if len(self._all) + self._starting < self.workers:
+                    self._starting += 1
+                    break
+                self._available.wait()
+        try:
+            worker = _Worker(self._context)
+        finally:
+            with self._available:
+                self._starting -= 1
+                self._available.notify()
+        with self._available:
+            self._all.add(worker)
+        return worker
+
+    def _release(self, worker, healthy=True):
+        recycle = self.max_tasks_per_child and worker.tasks >= self.max_tasks_per_child
+        with self._available:
+            if healthy and not recycle:
+                self._idle.append(worker)
+            else:
+                self._all.discard(worker)
+            self._available.notify()
+        if not healthy or recycle:
+            worker.stop(kill=not healthy)
+            if not healthy:
+                with self._stats_lock:
+                    self.replaced += 1
+
+    def _crashed(self, worker, message):
+        self._release(worker, healthy=False)
+        with self._stats_lock:
+            self.crashes += 1
+        return ExtractionError(message, 'worker_crash')
+
+    def extract(self, source):
+        """Extracts features from a single PDF; same contract as extract_features_with_stats."""
+        if self.workers <= 0:
+            return extract_features_with_stats(source)
+        with self._stats_lock:
+            self.submissions += 1
+
+        worker = self._acquire()
+        try:
+            if not worker.ready:
+                if not worker.conn.poll(self.startup_timeout):
+                    raise self._crashed(worker, "PDF extraction worker did not start")
+                worker.conn.recv()
+                worker.ready = True
+            worker.tasks += 1
+            # The worker is idle, so the document starts now.
+            worker.conn.send(source)
+            if not worker.conn.poll(self.timeout):
+                self._release(worker, healthy=False)
+                with self._stats_lock:
+                    self.timeouts += 1
+                raise ExtractionError(f"PDF extraction timed out after {self.timeout:g} seconds", 'timeout')
+            ok, result = worker.conn.recv()
+        except (EOFError, OSError):
+            raise self._crashed(worker, "PDF extraction worker crashed while reading this document") from None
+        self._release(worker)
+        if not ok:
+            raise result
+        return result
+
+    def _extract_or_error(self, source):
+        try:
+            return self.extract(source)
+        except Exception as e:
+            return e
+
+    def extract_many(self, sources):
+        """
+        Extracts features from many PDFs in parallel. Returns a list in input order where
+        each entry is either the (features, extracted_data, stats) tuple or the raised exception.
+        """
+        if self.workers <= 0 or len(sources) <= 1:
+            return [self._extract_or_error(source) for source in sources]
+        with ThreadPoolExecutor(min(len(sources), self.workers)) as threads:
+            return list(threads.map(self._extract_or_error, sources))
+
+    def stats(self):
+        with self._lock:
+            idle, alive = len(self._idle), len(self._all)
+        with self._stats_lock:
+            return {
+                "workers": self.workers,
+                "processes": alive,
+                "idle": idle,
+                "submissions": self.submissions,
+                "timeouts": self.timeouts,
+                "crashes": self.crashes,
+                "workers_replaced": self.replaced,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            workers, self._idle, self._all = list(self._all), [], set()
+        for worker in workers:
+            worker.stop(kill=True)
+
+
+extraction_pool = ExtractionPool()
+atexit.register(extraction_pool.shutdown)
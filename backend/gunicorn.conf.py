@@ -0,0 +1,38 @@
+"""
+gunicorn settings, picked up automatically when running `gunicorn app:app` from the
+backend directory.
+
+With preload_app (the default here) the app is imported once in the master and the model
+artifacts are loaded there before the workers are forked, so every worker shares the same
+pages copy-on-write instead of unpickling its own copy. Each worker then builds its
+inference path and runs one warm-up prediction before it accepts requests.
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app was imported and before any worker forks.
+    if not preload_app:
+        return
+    from app import registry
+
+    registry.load()
+    # Keep the loaded objects out of the collector's generations so GC passes in the
+    # workers do not write to (and so un-share) their pages.
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # After the fork: anything that starts threads (XGBoost's thread pool, the job
+    # queue workers) is set up per worker.
+    from app import registry, job_queue
+
+    registry.warm_up()
+    job_queue.start()
@@ -0,0 +1,228 @@
+"""
+Inference without per-request pandas DataFrames.
+
+FastPredictor applies the fitted RobustScaler (center/scale) and the Sex LabelEncoder
+mapping as precomputed NumPy arrays, writes the result into a preallocated float32 row
+and calls the XGBoost booster directly through inplace_predict. PandasPredictor is the
+original DataFrame path and is kept as the reference implementation.
+
+The scaling is done in float64, exactly as RobustScaler.transform does, and only then
+narrowed to float32 (which is what XGBoost converts a DataFrame to internally), so both
+paths feed the booster identical bits. load_predictor checks that on reference records
+at startup and falls back to the pandas path if they ever disagree.
+
+tests/test_inference_parity.py checks parity on the reference records plus random ones.
+Run `python inference.py` from the backend directory to also compare the latency of both paths.
+"""
+import time
+import threading
+
+import numpy as np
+
+# Raw feature names (as used by the API) in the column order expected by the model.
+FEATURE_FIELDS = ['Hematocrit', 'Hemoglobin', 'Erythrocyte', 'Leucocyte', 'Thrombocyte',
+                  'Mch', 'Mchc', 'Mcv', 'Age', 'Sex']
+NUMERIC_FIELDS = FEATURE_FIELDS[:-1]
+MODEL_COLUMNS = ['HAEMATOCRIT', 'HAEMOGLOBINS', 'ERYTHROCYTE', 'LEUCOCYTE', 'THROMBOCYTE',
+                 'MCH', 'MCHC', 'MCV', 'AGE', 'SEX']
+NUMERIC_COLS = MODEL_COLUMNS[:-1]
+
+# Values from the bundled sample reports plus a few out-of-range records.
+REFERENCE_RECORDS = [
+    {'Hematocrit': 33.7, 'Hemoglobin': 10.8, 'Erythrocyte': 3.67, 'Leucocyte': 6.7, 'Thrombocyte': 70.0,
+     'Mch': 29.4, 'Mchc': 32.0, 'Mcv': 91.8, 'Age': 92.0, 'Sex': 'F'},
+    {'Hematocrit': 54.0, 'Hemoglobin': 16.6, 'Erythrocyte': 7.61, 'Leucocyte': 10.0, 'Thrombocyte': 88.0,
+     'Mch': 21.8, 'Mchc': 30.7, 'Mcv': 71.0, 'Age': 1.0, 'Sex': 'F'},
+    {'Hematocrit': 39.6, 'Hemoglobin': 12.8, 'Erythrocyte': 4.81, 'Leucocyte': 16.1, 'Thrombocyte': 378.0,
+     'Mch': 26.6, 'Mchc': 32.3, 'Mcv': 82.3, 'Age': 68.0, 'Sex': 'F'},
+    {'Hematocrit': 49.4, 'Hemoglobin': 16.5, 'Erythrocyte': 5.82, 'Leucocyte': 8.5, 'Thrombocyte': 281.0,
+     'Mch': 28.4, 'Mchc': 33.4, 'Mcv': 84.9, 'Age': 30.0, 'Sex': 'M'},
+    {'Hematocrit': 36.3, 'Hemoglobin': 11.4, 'Erythrocyte': 5.88, 'Leucocyte': 18.3, 'Thrombocyte': 282.0,
+     'Mch': 19.4, 'Mchc': 31.4, 'Mcv': 61.7, 'Age': 44.0, 'Sex': 'F'},
+    {'Hematocrit': 0.0, 'Hemoglobin': 0.0, 'Erythrocyte': 0.0, 'Leucocyte': 0.0, 'Thrombocyte': 0.0,
+     'Mch': 0.0, 'Mchc': 0.0, 'Mcv': 0.0, 'Age': 0.0, 'Sex': 'M'},
+    {'Hematocrit': 75.0, 'Hemoglobin': 25.0, 'Erythrocyte': 9.99, 'Leucocyte': 250.0, 'Thrombocyte': 1500.0,
+     'Mch': 45.0, 'Mchc': 45.0, 'Mcv': 140.0, 'Age': 120.0, 'Sex': 'F'},
+]
+
+
+def build_raw_feature_dict(data):
+    """Request/row fields → the raw feature record the predictors take (numbers as floats)."""
+    raw_feature_dict = {field: float(data[field]) for field in NUMERIC_FIELDS}
+    raw_feature_dict['Sex'] = data['Sex']
+    return raw_feature_dict
+
+
+def unseen_sex_error(value):
+    # Same wording as LabelEncoder.transform, which the pandas path raised.
+    return ValueError(f"y contains previously unseen labels: {[value]}")
+
+
+class PandasPredictor:
+    """The original request path: a DataFrame per call, scaler.transform and model.predict."""
+
+    def __init__(self, model, scaler, label_encoder_sex):
+        self.model = model
+        self.scaler = scaler
+        self.label_encoder_sex = label_encoder_sex
+
+    def _frame(self, raw_feature_dicts):
+        import pandas as pd
+
+        new_data = pd.DataFrame({
+            column: [d[field] for d in raw_feature_dicts]
+            for field, column in zip(FEATURE_FIELDS, MODEL_COLUMNS)
+        })
+        new_data_scaled = new_data.copy()
+        new_data_scaled['SEX'] = self.label_encoder_sex.transform(new_data_scaled['SEX'])
+        new_data_scaled[NUMERIC_COLS] = self.scaler.transform(new_data_scaled[NUMERIC_COLS])
+        return new_data_scaled
+
+    def predict_proba(self, raw_feature_dicts):
+        return self.model.predict_proba(self._frame(raw_feature_dicts))[:, 1]
+
+    def predict(self, raw_feature_dicts):
+        return self.model.predict(self._frame(raw_feature_dicts))
+
+    def predict_one(self, raw_feature_dict, timings=None):
+        """Prediction for one record; `timings`, if given, receives the transform/model seconds."""
+        if timings is None:
+            return int(self.predict([raw_feature_dict])[0])
+        started = time.perf_counter()
+        frame = self._frame([raw_feature_dict])
+        transformed = time.perf_counter()
+        prediction = int(self.model.predict(frame)[0])
+        timings["transform"] = transformed - started
+        timings["model"] = time.perf_counter() - transformed
+        return prediction
+
+
+class FastPredictor:
+    """
+    NumPy/booster inference path. predict() scores a stacked batch of records;
+    predict_one() reuses a preallocated per-thread float32 row.
+    """
+
+    def __init__(self, model, scaler, label_encoder_sex):
+        self.booster = model.get_booster()
+        self.missing = model.missing
+        # Honours best_iteration from early stopping, like XGBClassifier.predict.
+        self.iteration_range = model._get_iteration_range(None)
+        self.center = np.asarray(scaler.center_ if scaler.with_centering else np.zeros(len(NUMERIC_COLS)),
+                                 dtype=np.float64)
+        self.scale = np.asarray(scaler.scale_ if scaler.with_scaling else np.ones(len(NUMERIC_COLS)),
+                                dtype=np.float64)
+        self.sex_codes = {label: code for code, label in enumerate(label_encoder_sex.classes_.tolist())}
+        self._local = threading.local()
+
+    def sex_code(self, value):
+        try:
+            return self.sex_codes[value]
+        except (KeyError, TypeError):
+            raise unseen_sex_error(value) from None
+
+    def transform(self, raw_feature_dicts):
+        """Scaled, encoded float32 model input for a list of records."""
+        numeric = np.array([[d[field] for field in NUMERIC_FIELDS] for d in raw_feature_dicts],
+                           dtype=np.float64)
+        numeric -= self.center
+        numeric /= self.scale
+        matrix = np.empty((len(raw_feature_dicts), len(MODEL_COLUMNS)), dtype=np.float32)
+        matrix[:, :-1] = numeric
+        matrix[:, -1] = [self.sex_code(d['Sex']) for d in raw_feature_dicts]
+        return matrix
+
+    def predict_proba_matrix(self, matrix):
+        return self.booster.inplace_predict(
+            matrix,
+            iteration_range=self.iteration_range,
+            predict_type="value",
+            missing=self.missing,
+            validate_features=False,
+        )
+
+    def predict_proba(self, raw_feature_dicts):
+        return self.predict_proba_matrix(self.transform(raw_feature_dicts))
+
+    def predict(self, raw_feature_dicts):
+        return (self.predict_proba(raw_feature_dicts) > 0.5).astype(np.int64)
+
+    def predict_one(self, raw_feature_dict, timings=None):
+        """Prediction for one record; `timings`, if given, receives the transform/model seconds."""
+        started = time.perf_counter() if timings is not None else 0.0
+        local = self._local
+        if not hasattr(local, 'row'):
+            local.numeric = np.empty(len(NUMERIC_FIELDS), dtype=np.float64)
+            local.row = np.empty((1, len(MODEL_COLUMNS)), dtype=np.float32)
+        numeric, row = local.numeric, local.row
+
+        for i, field in enumerate(NUMERIC_FIELDS):
+            numeric[i] = raw_feature_dict[field]
+        numeric -= self.center
+        numeric /= self.scale
+        row[0, :-1] = numeric
+        row[0, -1] = self.sex_code(raw_feature_dict['Sex'])
+        if timings is None:
+            return int(self.predict_proba_matrix(row)[0] > 0.5)
+        transformed = time.perf_counter()
+        prediction = int(self.predict_proba_matrix(row)[0] > 0.5)
+        timings["transform"] = transformed - started
+        timings["model"] = time.perf_counter() - transformed
+        return prediction
+
+
+def check_parity(fast, reference, records):
+    """True when both predictors give bit-for-bit identical probabilities for `records`."""
+    fast_proba = np.asarray(fast.predict_proba(records), dtype=np.float32)
+    reference_proba = np.asarray(reference.predict_proba(records), dtype=np.float32)
+    if fast_proba.tobytes() != reference_proba.tobytes():
+        return False
+    return all(fast.predict_one(record) == int(p > 0.5) for record, p in zip(records, reference_proba))
+
+
+def load_predictor(model, scaler, label_encoder_sex):
+    """FastPredictor, unless it disagrees with the pandas path on the reference records."""
+    reference = PandasPredictor(model, scaler, label_encoder_sex)
+    try:
+        fast = FastPredictor(model, scaler, label_encoder_sex)
+        if check_parity(fast, reference, REFERENCE_RECORDS):
+            return fast
+        print("Fast inference path disagrees with the pandas path; using the pandas path")
+    except Exception as e:
+        print(f"Fast inference path unavailable ({e}); using the pandas path")
+    return reference
+
+
+def random_records(count, seed=0):
+    rng = np.random.default_rng(seed)
+    low = np.array([20, 5, 2, 1, 20, 15, 25, 50, 0], dtype=np.float64)
+    high = np.array([65, 22, 8, 40, 900, 40, 40, 120, 100], dtype=np.float64)
+    # Round like lab values so the inputs look like what the API actually receives.
+    values = np.round(rng.uniform(low, high, size=(count, len(NUMERIC_FIELDS))), 2)
+    sexes = rng.choice(['M', 'F'], size=count)
+    return [dict(zip(NUMERIC_FIELDS, map(float, row)), Sex=str(sex)) for row, sex in zip(values, sexes)]
+
+
+def main():
+    import warnings
+    from model_registry import registry
+
+    warnings.filterwarnings('ignore')
+    bundle = registry.get()
+    reference = PandasPredictor(bundle.model, bundle.scaler, bundle.label_encoder_sex)
+    fast = FastPredictor(bundle.model, bundle.scaler, bundle.label_encoder_sex)
+
+    records = REFERENCE_RECORDS + random_records(10000)
+    print("batch parity:", check_parity(fast, reference, records))
+    print("single-row parity:", all(
+        fast.predict_one(record) == reference.predict_one(record) for record in records[:1000]))
+
+    for name, predictor in (("pandas", reference), ("fast", fast)):
+        start = time.perf_counter()
+        for record in records[:1000]:
+            predictor.predict_one(record)
+        print(f"{name:>6} single row: {(time.perf_counter() - start) / 1000 * 1e6:8.1f} µs")
+
+
+if __name__ == '__main__':
+    main()
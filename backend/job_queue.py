@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from urllib.parse import urlsplit
+
+# SQLite file holding queued jobs, their payloads and results. Shared by every gunicorn
+# worker on the host, so a job can be polled from any of them.
+JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH', 'jobs.db')
+# Background threads per process that run jobs (0 accepts jobs but leaves them queued
+# for other processes).
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+# Submissions are refused with 503 once this many jobs are queued or running.
+JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 100))
+# Attempts per job for transient failures (timeouts, crashed extraction workers).
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+# Seconds before the first retry; doubled for every further attempt.
+JOB_RETRY_DELAY = float(os.environ.get('JOB_RETRY_DELAY', 2))
+# Seconds finished jobs (and their results) are kept before they are purged.
+JOB_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', 3600))
+# A running job whose worker has not finished it within this many seconds (for example
+# because the process died) is handed to another worker.
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 300))
+# Retry-After sent with 503 responses when the queue is full.
+JOB_RETRY_AFTER = int(os.environ.get('JOB_RETRY_AFTER', 5))
+# Seconds callback URLs are given to respond.
+JOB_CALLBACK_TIMEOUT = float(os.environ.get('JOB_CALLBACK_TIMEOUT', 5))
+# Comma-separated host names that callback URLs may point at. Results are only ever POSTed
+# to these hosts; with none configured, submissions with a callback_url are refused.
+JOB_CALLBACK_HOSTS = [host.strip().lower() for host in os.environ.get('JOB_CALLBACK_HOSTS', '').split(',')
+                      if host.strip()]
+
+
+class QueueFull(Exception):
+    pass
+
+
+def check_callback_url(url, allowed_hosts=JOB_CALLBACK_HOSTS):
+    """Raises ValueError unless `url` is an http(s) URL on one of `allowed_hosts`."""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    if not allowed_hosts:
+        raise ValueError("Job callbacks are disabled on this server")
+    if parts.hostname.lower() not in allowed_hosts:
+        raise ValueError(f"callback_url host {parts.hostname} is not allowed")
+
+
+class JobQueue:
+    """
+    SQLite-backed queue of background jobs.
+
+    `handler(payload, options)` runs a job and returns its JSON result. Exceptions of the
+    types in `transient_errors` are retried with exponential backoff up to `max_attempts`
+    times; any other exception fails the job with its message. Finished jobs are kept for
+    `result_ttl` seconds. If a job has a callback URL (on one of `callback_hosts`), its
+    final state is POSTed there.
+    """
+
+    def __init__(self, handler, transient_errors=(), path=JOB_STORE_PATH, workers=JOB_WORKERS,
+                 max_pending=JOB_MAX_PENDING, max_attempts=JOB_MAX_ATTEMPTS,
+                 retry_delay=JOB_RETRY_DELAY, result_ttl=JOB_RESULT_TTL,
+                 lease_seconds=JOB_LEASE_SECONDS, retry_after=JOB_RETRY_AFTER,
+                 callback_timeout=JOB_CALLBACK_TIMEOUT, callback_hosts=JOB_CALLBACK_HOSTS,
+                 poll_interval=1.0):
+        self.handler = handler
+        self.transient_errors = tuple(transient_errors)
+        self.path = path
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.result_ttl = result_ttl
+        self.lease_seconds = lease_seconds
+        self.retry_after = retry_after
+        self.callback_timeout = callback_timeout
+        self.callback_hosts = callback_hosts
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._db = None
+        self._db_pid = None
+
+    def _connect(self):
+        # Reopened in each process: an SQLite connection must not be used across fork(),
+        # and the app (with this queue) is imported in the gunicorn master.
+        if self._db is None or self._db_pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, payload BLOB, options TEXT NOT NULL, "
+                "callback_url TEXT, attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, "
+                "created_at REAL NOT NULL, run_after REAL NOT NULL, started_at REAL, "
+                "lease_until REAL, finished_at REAL, expires_at REAL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, run_after)")
+            self._db, self._db_pid = db, os.getpid()
+        return self._db
+
+    def _execute(self, sql, params=()):
+        with self._db_lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def start(self):
+        """
+        Starts (or restarts any dead) job threads. Called from each server process once it
+        is serving (gunicorn's post_worker_init, the ASGI lifespan) and on every submit,
+        so the jobs queued in the shared store are picked up by whichever process is up.
+        """
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f'job-worker-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, payload, options=None, callback_url=None):
+        """
+        Queues a job and returns its id. Raises QueueFull when `max_pending` jobs are waiting
+        and ValueError for a callback URL that is not allowed.
+        """
+        if callback_url:
+            check_callback_url(callback_url, self.callback_hosts)
+        self.start()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                pending = db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until > ?)",
+                    (now,),
+                ).fetchone()[0]
+                if pending >= self.max_pending:
+                    raise QueueFull(f"Job queue is full ({pending} jobs pending)")
+                db.execute(
+                    "INSERT INTO jobs (id, status, payload, options, callback_url, created_at, run_after) "
+                    "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                    (job_id, payload, json.dumps(options or {}), callback_url, now, now),
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """The public state of a job, or None if it does not exist (or has expired)."""
+        rows = self._execute(
+            "SELECT id, status, attempts, result, error, created_at, started_at, finished_at "
+            "FROM jobs WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (job_id, time.time()),
+        )
+        if not rows:
+            return None
+        job_id, status, attempts, result, error, created_at, started_at, finished_at = rows[0]
+        job = {
+            "id": job_id,
+            "status": status,
+            "attempts": attempts,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+        }
+        if result is not None:
+            job["result"] = json.loads(result)
+        if error is not None:
+            job["error"] = error
+        return job
+
+    def _claim(self):
+        """Marks the oldest runnable job as running and returns (id, payload, options, attempts)."""
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose worker went away during their last attempt are failed, not rerun.
+                abandoned = [row[0] for row in db.execute(
+                    "SELECT id FROM jobs WHERE status = 'running' AND lease_until <= ? AND attempts >= ?",
+                    (now, self.max_attempts),
+                )]
+                for job_id in abandoned:
+                    db.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, payload = NULL, finished_at = ?, "
+                        "lease_until = NULL, expires_at = ? WHERE id = ?",
+                        ("Job did not finish within its lease", now, now + self.result_ttl, job_id),
+                    )
+                row = db.execute(
+                    "SELECT id, payload, options, attempts FROM jobs "
+                    "WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_until <= ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is not None:
+                    db.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, "
+                        "lease_until = ? WHERE id = ?",
+                        (now, now + self.lease_seconds, row[0]),
+                    )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        for job_id in abandoned:
+            self._notify(job_id)
+        if row is None:
+            return None
+        job_id, payload, options, attempts = row
+        return job_id, payload, json.loads(options), attempts + 1
+
+    def _finish(self, job_id, status, result=None, error=None):
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, payload = NULL, finished_at = ?, "
+            "lease_until = NULL, expires_at = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, now,
+             now + self.result_ttl, job_id),
+        )
+
+    def _retry(self, job_id, attempts, error):
+        delay = self.retry_delay * 2 ** (attempts - 1)
+        self._execute(
+            "UPDATE jobs SET status = 'queued', error = ?, lease_until = NULL, run_after = ? WHERE id = ?",
+            (error, time.time() + delay, job_id),
+        )
+
+    def purge_expired(self):
+        self._execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def _run(self):
+        last_purge = 0.0
+        while True:
+            try:
+                # Expired results are swept about once a minute.
+                if time.time() - last_purge > 60:
+                    self.purge_expired()
+                    last_purge = time.time()
+                job = self._claim()
+                if job is not None:
+                    self._process(*job)
+                    continue
+            except sqlite3.Error as e:
+                print("Job queue error:", str(e))
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _process(self, job_id, payload, options, attempts):
+        try:
+            result = self.handler(payload, options)
+        except self.transient_errors as e:
+            print(f"Job {job_id} attempt {attempts} failed:", str(e))
+            if attempts < self.max_attempts:
+                self._retry(job_id, attempts, str(e))
+                return
+            self._finish(job_id, 'failed', error=str(e))
+        except Exception as e:
+            print(f"Job {job_id} failed:", str(e))
+            self._finish(job_id, 'failed', error=str(e))
+        else:
+            self._finish(job_id, 'done', result=result)
+        self._notify(job_id)
+
+    def _notify(self, job_id):
+        rows = self._execute("SELECT callback_url FROM jobs WHERE id = ?", (job_id,))
+        if not rows or not rows[0][0]:
+            return
+        import requests
+
+        try:
+            # Checked again in case the allowed hosts changed since the job was queued.
+            # Redirects are not followed, so the POST cannot be sent on to another host.
+            check_callback_url(rows[0][0], self.callback_hosts)
+            requests.post(rows[0][0], json=self.get(job_id), timeout=self.callback_timeout,
+                          allow_redirects=False)
+        except (ValueError, requests.RequestException) as e:
+            print(f"Job {job_id} callback failed:", str(e))
+
+    def stats(self):
+        counts = dict(self._execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        return {
+            "queued": counts.get('queued', 0),
+            "running": counts.get('running', 0),
+            "done": counts.get('done', 0),
+            "failed": counts.get('failed', 0),
+            "max_pending": self.max_pending,
+            "workers": self.workers,
+        }
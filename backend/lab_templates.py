@@ -0,0 +1,171 @@
+"""
+Per-lab layout templates for CBC reports, loaded from lab_templates.json.
+
+A template describes one lab's report format: the page it applies to, the page size, and
+anchors (boxes that must contain a given text, such as the section title and the table
+labels) that together fingerprint the format. For a matching document each field is read
+from its own box, so a value can never be taken from the wrong row. Boxes are
+[x0, top, x1, bottom] in PDF points from the top-left corner, as in pdfplumber.
+
+Reading the boxes is cheaper than the text parser's page.extract_text(): characters are
+taken straight from pdfminer's layout of the page (page.layout, which pdfplumber caches),
+skipping pdfplumber's conversion of every object on the page (lines, rects, ...) into
+dicts, and are gathered into all of a template's boxes in one pass rather than with one
+page.crop() per box, as each crop filters the page's objects again. On a fallback the
+text parser reuses the cached layout, so a miss costs little.
+
+Documents that match no template, or whose template boxes do not hold a valid value,
+fall back to the text parser in pdf_extraction.
+
+To write a template for a new format, print a report's words with their boxes:
+    python lab_templates.py report.pdf [--words]
+"""
+import os
+import re
+import json
+
+from pdfminer.layout import LTChar, LTContainer
+
+# JSON file with one template per lab report format.
+LAB_TEMPLATES_PATH = os.environ.get(
+    'LAB_TEMPLATES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lab_templates.json'))
+# Points of tolerance when comparing a document's page size with a template's.
+PAGE_SIZE_TOLERANCE = 1.0
+# Characters whose tops differ by more than this many points are on different lines.
+LINE_TOLERANCE = 3.0
+
+_NUMBER_PATTERN = r"(\d+(\.\d+)?)"
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(text):
+    return _WHITESPACE.sub("", text).upper()
+
+
+class LabTemplate:
+    def __init__(self, spec):
+        self.name = spec['name']
+        self.page = spec.get('page', 0)
+        self.page_size = spec.get('page_size')
+        self.anchors = [(tuple(anchor['bbox']), _normalize(anchor['text'])) for anchor in spec.get('anchors', [])]
+        # feature -> (box, compiled pattern whose first group is the value)
+        self.fields = {feature: (tuple(field['bbox']), re.compile(field.get('pattern', _NUMBER_PATTERN)))
+                       for feature, field in spec['fields'].items()}
+        self._boxes = [box for box, _ in self.anchors] + [box for box, _ in self.fields.values()]
+
+    def fits_page(self, page):
+        """The cheap part of the fingerprint: page size, read without parsing the page."""
+        if self.page_size is None:
+            return True
+        width, height = self.page_size
+        return (abs(page.width - width) <= PAGE_SIZE_TOLERANCE
+                and abs(page.height - height) <= PAGE_SIZE_TOLERANCE)
+
+    def box_texts(self, page):
+        """Text of every anchor and field box (anchors first), from one pass over the page's characters."""
+        layout = page.layout
+        left, page_top = layout.x0, layout.y1
+        hits = [[] for _ in self._boxes]
+        boxes = list(enumerate(self._boxes))
+        for char in _layout_chars(layout):
+            # pdfminer's y axis points up; boxes are measured from the top like pdfplumber's.
+            x = (char.x0 + char.x1) / 2 - left
+            y = page_top - (char.y0 + char.y1) / 2
+            for index, (x0, top, x1, bottom) in boxes:
+                if x0 <= x <= x1 and top <= y <= bottom:
+                    hits[index].append((page_top - char.y1, char.x0, char.get_text()))
+        return [_chars_to_text(chars) for chars in hits]
+
+    def extract(self, page):
+        """
+        Returns (matched, values): whether every anchor holds its text, and the fields as
+        {feature: value} (Sex as the matched letter, the rest as floats), or None when
+        the anchors or any field box do not match.
+        """
+        texts = self.box_texts(page)
+        for (_, expected), text in zip(self.anchors, texts):
+            if expected not in _normalize(text):
+                return False, None
+        values = {}
+        for (feature, (_, pattern)), text in zip(self.fields.items(), texts[len(self.anchors):]):
+            match = pattern.search(text.upper())
+            if match is None:
+                return True, None
+            values[feature] = match.group(1) if feature == 'Sex' else float(match.group(1))
+        return True, values
+
+
+def _layout_chars(container):
+    for item in container:
+        if isinstance(item, LTChar):
+            yield item
+        elif isinstance(item, LTContainer):
+            yield from _layout_chars(item)
+
+
+def _chars_to_text(chars):
+    """(top, x0, text) characters in reading order, one line of text per row of characters."""
+    if not chars:
+        return ""
+    chars.sort()
+    lines = [[chars[0]]]
+    for char in chars[1:]:
+        if char[0] - lines[-1][0][0] > LINE_TOLERANCE:
+            lines.append([char])
+        else:
+            lines[-1].append(char)
+    return "\n".join("".join(text for _, _, text in sorted(line, key=lambda char: char[1])) for line in lines)
+
+
+class TemplateRegistry:
+    """The lab templates, tried in file order against a document's pages."""
+
+    def __init__(self, path=LAB_TEMPLATES_PATH):
+        self.path = path
+        with open(path) as f:
+            self.templates = [LabTemplate(spec) for spec in json.load(f).get('templates', [])]
+
+    def extract(self, pages):
+        """
+        Returns (template, values) for the first template whose fingerprint matches,
+        with values None if its boxes could not be read; (None, None) when none matches.
+        """
+        for template in self.templates:
+            if template.page >= len(pages) or not template.fits_page(pages[template.page]):
+                continue
+            matched, values = template.extract(pages[template.page])
+            if matched:
+                return template, values
+        return None, None
+
+
+template_registry = TemplateRegistry()
+
+
+def main():
+    import argparse
+    import time
+    import pdfplumber
+
+    parser = argparse.ArgumentParser(description="Show which lab template matches each report.")
+    parser.add_argument('pdfs', nargs='+')
+    parser.add_argument('--words', action='store_true', help="print the words of the first page with their boxes")
+    args = parser.parse_args()
+
+    for path in args.pdfs:
+        with pdfplumber.open(path) as pdf:
+            started = time.perf_counter()
+            template, values = template_registry.extract(pdf.pages)
+            elapsed = time.perf_counter() - started
+            page = pdf.pages[0]
+            print(f"{path}: {page.width:g}x{page.height:g}, template={template.name if template else None}, "
+                  f"values={values}, {elapsed * 1e3:.1f} ms")
+            if args.words:
+                for word in page.extract_words(keep_blank_chars=True):
+                    if word['text'].strip():
+                        print(f"  [{word['x0']:.1f}, {word['top']:.1f}, {word['x1']:.1f}, {word['bottom']:.1f}] "
+                              f"{word['text'].strip()}")
+
+
+if __name__ == '__main__':
+    main()
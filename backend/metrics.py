@@ -0,0 +1,261 @@
+"""
+In-process metrics in the Prometheus text exposition format, plus an opt-in sampling
+profiler for single requests.
+
+Counters and histograms live in this process only; under gunicorn every worker keeps its
+own, so each scrape of /metrics reports the worker that answered it (the `pid` gauge says
+which one).
+"""
+import os
+import sys
+import time
+import threading
+from bisect import bisect_left
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+
+# Allow ?profile=1 to run the sampling profiler for that request.
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '0') == '1'
+# Seconds between stack samples of a profiled request.
+PROFILER_INTERVAL = float(os.environ.get('PROFILER_INTERVAL', 0.002))
+# Directory the collapsed stacks of profiled requests are written to.
+PROFILER_DIR = os.environ.get('PROFILER_DIR', 'profiles')
+
+# Latency buckets in seconds, from sub-millisecond model calls to slow PDF extractions.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+               for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Named counters and histograms, plus collectors: callables returning gauge samples
+    as (name, documentation, {label tuple: value}, labelnames) that are read at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                gauges = collector()
+            except Exception as e:
+                print("Metrics collector error:", str(e))
+                continue
+            for name, documentation, samples, labelnames in gauges:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in samples.items():
+                    lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def stats_gauges(prefix, documentation, stats):
+    """Gauges for every numeric entry of a stats() dict, e.g. result_cache.stats()."""
+    return [(f"{prefix}_{key}", f"{documentation} ({key})", {(): value}, ())
+            for key, value in stats.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)]
+
+
+metrics = MetricsRegistry()
+
+REQUESTS = metrics.counter(
+    'docassist_requests_total', 'HTTP requests by endpoint and status code.', ['endpoint', 'status'])
+REQUEST_SECONDS = metrics.histogram(
+    'docassist_request_seconds', 'HTTP request latency by endpoint.', ['endpoint'])
+STAGE_SECONDS = metrics.histogram(
+    'docassist_stage_seconds', 'Time spent in each stage of a prediction request.', ['endpoint', 'stage'])
+EXTRACTION_FAILURES = metrics.counter(
+    'docassist_extraction_failures_total', 'PDF reports that could not be scored, by reason.', ['reason'])
+CACHE_LOOKUPS = metrics.counter(
+    'docassist_cache_lookups_total', 'Result cache lookups by endpoint and outcome.', ['endpoint', 'result'])
+TEMPLATE_LOOKUPS = metrics.counter(
+    'docassist_template_lookups_total',
+    'PDF reports by matching lab template ("none" if no match) and outcome (hit, fallback or miss).',
+    ['template', 'result'])
+TEMPLATE_SECONDS = metrics.histogram(
+    'docassist_template_seconds', 'Time spent matching and reading a lab template, by template.', ['template'])
+SHADOW_RECORDS = metrics.counter(
+    'docassist_shadow_records_total',
+    'Records scored by the shadow candidate, by whether it agreed with the served model.', ['result'])
+ADMISSION_REJECTIONS = metrics.counter(
+    'docassist_admission_rejections_total',
+    'Requests answered 503 by the ASGI server because an executor was saturated, by executor.', ['executor'])
+SHADOW_SECONDS = metrics.histogram(
+    'docassist_shadow_seconds', 'Per-record scoring time of the served (primary) and candidate models.', ['model'])
+
+
+def stage(endpoint, name):
+    """Context manager timing one stage of a request into docassist_stage_seconds."""
+    return STAGE_SECONDS.time(endpoint=endpoint, stage=name)
+
+
+def observe_stages(endpoint, timings):
+    """Records stage durations measured elsewhere (e.g. in an extraction worker)."""
+    for name, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, endpoint=endpoint, stage=name)
+
+
+def observe_extraction(endpoint, extraction_stats):
+    """
+    Records what an extraction worker measured: its stage timings (popped from the
+    stats, which are returned to clients) and which lab template, if any, read the report.
+    """
+    timings = extraction_stats.pop("timings", {})
+    observe_stages(endpoint, timings)
+    if "template_result" in extraction_stats:
+        template = extraction_stats.get("template") or "none"
+        TEMPLATE_LOOKUPS.inc(template=template, result=extraction_stats["template_result"])
+        if "template" in timings:
+            TEMPLATE_SECONDS.observe(timings["template"], template=template)
+
+
+def failure_reason(error):
+    """Reason label for an extraction failure: ReportParseError/ExtractionError carry one."""
+    return getattr(error, 'reason', 'other')
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of one thread every `interval` seconds from a background
+    thread and counts the collapsed stacks ("outer;...;inner" -> samples), the input
+    format of flamegraph.pl and speedscope. Work done in other processes (the PDF
+    extraction pool) shows up as time spent waiting on it.
+    """
+
+    def __init__(self, thread_id=None, interval=PROFILER_INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = StackCounter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+    def write(self, name, directory=PROFILER_DIR):
+        """Writes the collapsed stacks to `directory`; returns the file's path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}-{time.time_ns() // 1000000}-{os.getpid()}.folded")
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
@@ -0,0 +1,135 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+# Collect /predict_manual requests for up to this many milliseconds before scoring them
+# together (0 disables batching and every request is scored on its own).
+PREDICT_BATCH_WINDOW_MS = float(os.environ.get('PREDICT_BATCH_WINDOW_MS', 0))
+# A batch is scored as soon as it holds this many requests, even inside the window.
+PREDICT_BATCH_MAX_SIZE = int(os.environ.get('PREDICT_BATCH_MAX_SIZE', 64))
+# Requests beyond this many queued ones are scored directly instead of waiting.
+PREDICT_BATCH_MAX_QUEUE = int(os.environ.get('PREDICT_BATCH_MAX_QUEUE', 1024))
+# Longest a caller waits for its batched result before giving up.
+PREDICT_BATCH_TIMEOUT = float(os.environ.get('PREDICT_BATCH_TIMEOUT', 10))
+
+
+class MicroBatcher:
+    """
+    Dynamic request batcher. Callers hand in one record each; a background thread
+    collects the records that arrive within `max_wait_ms` of the first one (or until
+    `max_batch_size` is reached), scores them with a single vectorized `predict_batch`
+    call and hands every caller its own prediction.
+
+    If the vectorized call fails (for example one record has an unknown Sex), the batch
+    is re-scored record by record so only the offending caller sees the error.
+    """
+
+    def __init__(self, predict_batch, max_wait_ms=PREDICT_BATCH_WINDOW_MS,
+                 max_batch_size=PREDICT_BATCH_MAX_SIZE, max_queue=PREDICT_BATCH_MAX_QUEUE,
+                 timeout=PREDICT_BATCH_TIMEOUT):
+        self.predict_batch = predict_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._worker = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        self.batches = 0
+        self.items = 0
+        self.bypassed = 0
+        self.max_batch_seen = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait_seen = 0.0
+        self.batch_sizes = {}
+
+    @property
+    def enabled(self):
+        return self.max_wait > 0 and self.max_batch_size > 1
+
+    def _ensure_worker(self):
+        # The batching thread is started by the first request that queues a record, and
+        # restarted by the next one should it ever die. The batcher is built when the app
+        # is imported, which may be in the gunicorn master, where a thread would not
+        # survive the fork into the workers.
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                    self._worker.start()
+
+    def predict(self, record):
+        """Prediction for a single record, batched with concurrent callers when enabled."""
+        if not self.enabled:
+            return self.predict_batch([record])[0]
+
+        future = Future()
+        try:
+            self._queue.put_nowait((record, future, time.perf_counter()))
+        except queue.Full:
+            with self._stats_lock:
+                self.bypassed += 1
+            return self.predict_batch([record])[0]
+
+        with self._stats_lock:
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        self._ensure_worker()
+        return future.result(timeout=self.timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = batch[0][2] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                                 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._score(batch)
+
+    def _score(self, batch):
+        started = time.perf_counter()
+        records = [record for record, _, _ in batch]
+        try:
+            predictions = self.predict_batch(records)
+            for (_, future, _), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+        except Exception:
+            for record, future, _ in batch:
+                try:
+                    future.set_result(self.predict_batch([record])[0])
+                except Exception as e:
+                    future.set_exception(e)
+
+        waits = [started - enqueued for _, _, enqueued in batch]
+        with self._stats_lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self.total_wait += sum(waits)
+            self.max_wait_seen = max(self.max_wait_seen, max(waits))
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "enabled": self.enabled,
+                "max_wait_ms": self.max_wait * 1000,
+                "max_batch_size": self.max_batch_size,
+                "batches": self.batches,
+                "items": self.items,
+                "bypassed": self.bypassed,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "max_batch_seen": self.max_batch_seen,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "mean_wait_ms": self.total_wait / self.items * 1000 if self.items else 0.0,
+                "max_wait_ms_seen": self.max_wait_seen * 1000,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            }
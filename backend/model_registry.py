@@ -0,0 +1,465 @@
+"""
+Process-wide, lazily loaded model artifacts.
+
+Nothing is read from `models/` at import time: the model, scaler and label encoder are
+loaded on first use, or up front through `registry.load()`: with PRELOAD_MODELS=1 when
+the app is imported, and from gunicorn.conf.py in the master before the workers are
+forked, so they share the loaded pages copy-on-write. The inference path itself is built
+on first use (or by `registry.warm_up()`) in each worker, after the fork.
+
+When `models/xgboost_model.ubj` (or `.json`) was converted from the current pickled
+`xgboost_model.sav` it is loaded instead; XGBoost's native format loads faster and does not
+execute code. The pickle stays the source of truth: the native file records the digest of
+the `.sav` it came from and is ignored once the `.sav` is replaced, and the version used in
+cache keys is always the digest of the `.sav`. Create (or refresh) the native file with:
+    python model_registry.py convert [--format ubj|json]
+
+Versioned artifact sets live in `models/<version>/` (same file names). `models/CURRENT`
+names the version to serve and `models/SHADOW` an optional candidate that is scored in
+shadow mode (see shadow_scorer.py); without CURRENT the unversioned files in `models/`
+are served. Versions are immutable once published:
+    python model_registry.py publish v2 --from /path/to/new/artifacts
+    python model_registry.py shadow v2        # compare v2 on live traffic
+    python model_registry.py promote v2       # serve v2
+    python model_registry.py list
+
+Every process checks the pointer files every MODEL_RELOAD_INTERVAL seconds (and POST
+/models/reload does it at once) and hot-reloads what changed: the new bundle is loaded
+and warmed up in the background, then swapped in with a single assignment, so requests in
+flight finish on the bundle they started with and none of them waits for the load.
+
+Load and warm-up times, app import time and the latency of the first request are kept in
+`registry.timings` and served by GET /startup. `python model_registry.py report` prints
+the same report for a cold start of the app in a fresh process.
+"""
+import os
+import re
+import time
+import pickle
+import shutil
+import threading
+
+from inference import REFERENCE_RECORDS, load_predictor
+from result_cache import file_digest
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+# Load the model artifacts when the app is imported instead of on the first request.
+PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS', '0') == '1'
+
+# Seconds between checks of models/CURRENT and models/SHADOW for a version to hot-reload
+# (0 turns the periodic check off; POST /models/reload still works).
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 10))
+
+# Native booster files, in order of preference over the pickled model.
+NATIVE_MODEL_FORMATS = ['ubj', 'json']
+# Booster attribute in which a native model file records the digest of its .sav.
+SOURCE_DIGEST_ATTR = 'source_model_digest'
+CURRENT_POINTER = 'CURRENT'
+SHADOW_POINTER = 'SHADOW'
+_VERSION_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+
+def artifact_paths(directory):
+    """(pickled model path, scaler path, label encoder path) of the artifact set in `directory`."""
+    return (os.path.join(directory, "xgboost_model.sav"), os.path.join(directory, "scaler.pkl"),
+            os.path.join(directory, "label_encoder_sex.pkl"))
+
+
+def native_model_paths(directory):
+    """(path, format) of the native model files present in `directory`, in order of preference."""
+    return [(path, native_format) for native_format in NATIVE_MODEL_FORMATS
+            for path in [os.path.join(directory, f"xgboost_model.{native_format}")] if os.path.exists(path)]
+
+
+class ModelBundle:
+    """
+    One loaded set of artifacts, never modified once loaded. The inference path is built
+    on first use. `name` is the version directory (None for the unversioned files) and
+    `version` the digest of the files, used in cache keys.
+    """
+
+    def __init__(self, model, scaler, label_encoder_sex, version, model_format, name=None):
+        self.model = model
+        self.scaler = scaler
+        self.label_encoder_sex = label_encoder_sex
+        self.version = version
+        self.model_format = model_format
+        self.name = name
+        self._predictor = None
+        self._lock = threading.Lock()
+
+    @property
+    def predictor(self):
+        if self._predictor is None:
+            with self._lock:
+                if self._predictor is None:
+                    self._predictor = load_predictor(self.model, self.scaler, self.label_encoder_sex)
+        return self._predictor
+
+    def warm_up(self):
+        """Builds the inference path and runs one prediction."""
+        return self.predictor.predict_one(REFERENCE_RECORDS[0])
+
+    def describe(self):
+        return {"name": self.name, "version": self.version, "model_format": self.model_format}
+
+
+class ModelRegistry:
+    """
+    Loads the served (and shadow) artifact sets in `models_dir` once per process, records
+    how long it took, and hot-reloads them when the version pointers change.
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, reload_interval=MODEL_RELOAD_INTERVAL):
+        self.models_dir = models_dir
+        self.model_path = os.path.join(models_dir, "xgboost_model.sav")
+        self.scaler_path = os.path.join(models_dir, "scaler.pkl")
+        self.label_encoder_sex_path = os.path.join(models_dir, "label_encoder_sex.pkl")
+        self.reload_interval = reload_interval
+        self.timings = {}
+        self.reloads = 0
+        self._bundle = None
+        self._shadow = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._next_check = 0.0
+        self._failed_pointers = None
+
+    def native_model_path(self, model_format, name=None):
+        return os.path.join(self.version_dir(name), f"xgboost_model.{model_format}")
+
+    def version_dir(self, name=None):
+        """Directory of version `name`; the unversioned files for None."""
+        if name is None:
+            return self.models_dir
+        if not _VERSION_NAME.match(name):
+            raise ValueError(f"Invalid model version name: {name!r}")
+        return os.path.join(self.models_dir, name)
+
+    def versions(self):
+        """Names of the published versions."""
+        return sorted(name for name in os.listdir(self.models_dir)
+                      if _VERSION_NAME.match(name) and not name.endswith('.tmp')
+                      and os.path.exists(artifact_paths(self.version_dir(name))[0]))
+
+    def read_pointer(self, pointer):
+        """The version named by models/CURRENT or models/SHADOW, or None."""
+        try:
+            with open(os.path.join(self.models_dir, pointer)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def write_pointer(self, pointer, name):
+        """Points CURRENT or SHADOW at version `name` (None removes the pointer)."""
+        path = os.path.join(self.models_dir, pointer)
+        if name is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        if name not in self.versions():
+            raise LookupError(f"Unknown model version: {name}")
+        # Written to a temporary file and renamed so readers never see a partial name.
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'w') as f:
+            f.write(name + "\n")
+        os.replace(temporary, path)
+
+    def record(self, name, seconds):
+        self.timings[name] = round(seconds * 1000, 3)
+
+    def _timed(self, name, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        self.record(name, time.perf_counter() - started)
+        return result
+
+    @staticmethod
+    def _import_libraries():
+        # Imported on first load rather than with the app; timed on their own so the load
+        # timings below only cover reading the artifacts.
+        import xgboost  # noqa: F401
+        import sklearn.preprocessing  # noqa: F401
+
+    @staticmethod
+    def _unpickle(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    @staticmethod
+    def _load_native(path):
+        from xgboost import XGBClassifier
+
+        model = XGBClassifier()
+        model.load_model(path)
+        return model
+
+    @staticmethod
+    def _source_digest(model):
+        """Digest of the pickled model a native model was converted from (None if unknown)."""
+        return model.get_booster().attr(SOURCE_DIGEST_ATTR)
+
+    def _load_bundle(self, name, timed=False):
+        """Reads the artifact set of version `name`; with `timed` the steps go into self.timings."""
+        directory = self.version_dir(name)
+        model_path, scaler_path, label_encoder_sex_path = artifact_paths(directory)
+        step = self._timed if timed else (lambda _, func, *args: func(*args))
+        step('import_libraries', self._import_libraries)
+        model, model_format = None, 'pickle'
+        for native_path, native_format in native_model_paths(directory):
+            native = step('load_model', self._load_native, native_path)
+            if self._source_digest(native) == file_digest([model_path]):
+                model, model_format = native, native_format
+                break
+            print(f"Ignoring {native_path}: not converted from the current xgboost_model.sav "
+                  f"(run `python model_registry.py convert`)")
+        if model is None:
+            model = step('load_model', self._unpickle, model_path)
+        scaler = step('load_scaler', self._unpickle, scaler_path)
+        label_encoder_sex = step('load_label_encoder', self._unpickle, label_encoder_sex_path)
+        # Cached results are keyed on this so they are invalidated whenever the artifacts change.
+        # The pickled model is hashed even when a native copy of it is served.
+        version = file_digest([model_path, scaler_path, label_encoder_sex_path])
+        return ModelBundle(model, scaler, label_encoder_sex, version, model_format, name)
+
+    def load(self):
+        """Loads the artifacts unless that was already done (or failed) in this process."""
+        with self._lock:
+            if self._bundle is not None or self._error is not None:
+                return self._bundle
+            started = time.perf_counter()
+            try:
+                self._bundle = self._load_bundle(self.read_pointer(CURRENT_POINTER), timed=True)
+                print(f"Global objects loaded successfully from models directory! ({self._bundle.model_format} model)")
+            except Exception as e:
+                print(f"Error loading global objects: {str(e)}")
+                self._error = str(e)
+            self.record('load_total', time.perf_counter() - started)
+            shadow_name = self.read_pointer(SHADOW_POINTER)
+            if shadow_name is not None:
+                try:
+                    self._shadow = self._load_bundle(shadow_name)
+                except Exception as e:
+                    print(f"Error loading shadow model {shadow_name}: {str(e)}")
+            self._next_check = time.monotonic() + self.reload_interval
+            return self._bundle
+
+    def reload(self):
+        """
+        Re-reads models/CURRENT and models/SHADOW and loads the versions that changed. A new
+        bundle is loaded and warmed up before it replaces the old one, in one assignment.
+        Raises if a version cannot be loaded; the bundles in use are then kept.
+        """
+        with self._reload_lock:
+            started = time.perf_counter()
+            name, shadow_name = self.read_pointer(CURRENT_POINTER), self.read_pointer(SHADOW_POINTER)
+            try:
+                current = self._bundle
+                if current is None or current.name != name:
+                    bundle = self._load_bundle(name)
+                    bundle.warm_up()
+                    self._bundle = bundle
+                    self._error = None
+                    if current is not None:
+                        self.reloads += 1
+                    print(f"Model version {name or '(unversioned)'} loaded ({bundle.version})")
+                shadow = self._shadow
+                if shadow_name is None:
+                    self._shadow = None
+                elif shadow is None or shadow.name != shadow_name:
+                    bundle = self._load_bundle(shadow_name)
+                    bundle.warm_up()
+                    self._shadow = bundle
+            except Exception:
+                self._failed_pointers = (name, shadow_name)
+                raise
+            self._failed_pointers = None
+            self.record('reload_total', time.perf_counter() - started)
+            return self._bundle
+
+    def _check_pointers(self):
+        pointers = (self.read_pointer(CURRENT_POINTER), self.read_pointer(SHADOW_POINTER))
+        bundle, shadow = self._bundle, self._shadow
+        loaded = (bundle.name if bundle is not None else None, shadow.name if shadow is not None else None)
+        if pointers == loaded or pointers == self._failed_pointers:
+            return
+        try:
+            self.reload()
+        except Exception as e:
+            print(f"Error reloading model versions {pointers}: {str(e)}")
+
+    def _maybe_check_pointers(self):
+        # At most one check per interval, in a background thread so no request waits for it.
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self.reload_interval
+            threading.Thread(target=self._check_pointers, name='model-reload', daemon=True).start()
+        finally:
+            self._check_lock.release()
+
+    def get(self):
+        """The loaded bundle (loading it on first use), or None if loading failed."""
+        bundle = self._bundle
+        if bundle is None and self._error is None:
+            bundle = self.load()
+        if self.reload_interval > 0 and time.monotonic() >= self._next_check:
+            self._maybe_check_pointers()
+        return bundle
+
+    @property
+    def shadow(self):
+        """The candidate bundle scored in shadow mode, or None."""
+        return self._shadow
+
+    @property
+    def version(self):
+        """Version of the loaded artifacts, without triggering a load."""
+        return self._bundle.version if self._bundle is not None else None
+
+    def warm_up(self):
+        """Loads the artifacts, builds the inference path and runs one prediction."""
+        bundle = self.get()
+        if bundle is None:
+            return False
+        self._timed('build_predictor', lambda: bundle.predictor)
+        self._timed('warm_up_predict', bundle.warm_up)
+        if self._shadow is not None:
+            self._shadow.warm_up()
+        return True
+
+    def startup_report(self):
+        bundle = self._bundle
+        return {
+            "pid": os.getpid(),
+            "model_loaded": bundle is not None,
+            "model_format": bundle.model_format if bundle is not None else None,
+            "model_version": bundle.version if bundle is not None else None,
+            "model_name": bundle.name if bundle is not None else None,
+            "reloads": self.reloads,
+            "error": self._error,
+            "timings_ms": dict(self.timings),
+        }
+
+    def convert(self, model_format='ubj', name=None):
+        """Writes the pickled model in XGBoost's native format; returns the new file's path."""
+        if model_format not in NATIVE_MODEL_FORMATS:
+            raise ValueError(f"Unsupported model format: {model_format}")
+        source = artifact_paths(self.version_dir(name))[0]
+        model = self._unpickle(source)
+        # Recorded in the file so the loader can tell when the .sav has been replaced since.
+        model.get_booster().set_attr(**{SOURCE_DIGEST_ATTR: file_digest([source])})
+        path = self.native_model_path(model_format, name)
+        model.save_model(path)
+        return path
+
+    def publish(self, name, source_dir=None):
+        """Copies an artifact set (default: the unversioned files) into models/<name>/."""
+        target = self.version_dir(name)
+        if os.path.exists(target):
+            raise FileExistsError(f"Model version {name} already exists")
+        source_dir = source_dir or self.models_dir
+        temporary = f"{target}.{os.getpid()}.tmp"
+        os.makedirs(temporary)
+        # Native model files are copied along; they are only used if converted from this .sav.
+        for path in list(artifact_paths(source_dir)) + [path for path, _ in native_model_paths(source_dir)]:
+            shutil.copy2(path, temporary)
+        # Renamed into place so a half-copied version is never visible.
+        os.rename(temporary, target)
+        return target
+
+    def describe(self):
+        """The served and shadow versions and the published ones (GET /models)."""
+        bundle, shadow = self._bundle, self._shadow
+        return {
+            "current": bundle.describe() if bundle is not None else None,
+            "shadow": shadow.describe() if shadow is not None else None,
+            "available": self.versions(),
+            "pointers": {"current": self.read_pointer(CURRENT_POINTER), "shadow": self.read_pointer(SHADOW_POINTER)},
+            "reloads": self.reloads,
+            "error": self._error,
+        }
+
+
+registry = ModelRegistry()
+
+
+def cold_start_report():
+    """Imports the app and sends it one request, as a cold start would; returns the startup report."""
+    started = time.perf_counter()
+    import app
+    app_import = time.perf_counter() - started
+
+    client = app.app.test_client()
+    response = client.post('/predict_manual', json=REFERENCE_RECORDS[0])
+    report = client.get('/startup').get_json()
+    report["timings_ms"]["cold_import"] = round(app_import * 1000, 3)
+    report["first_response_status"] = response.status_code
+    return report
+
+
+def main():
+    import json
+    import argparse
+    import warnings
+
+    parser = argparse.ArgumentParser(description="Model artifact tools.")
+    parser.add_argument('command', choices=['convert', 'report', 'list', 'publish', 'promote', 'shadow'],
+                        help="convert: write the model in native XGBoost format; "
+                             "report: cold-start timings of the app in this process; "
+                             "list: published versions; publish VERSION: copy an artifact set into "
+                             "models/VERSION; promote VERSION: serve it; shadow VERSION: score it in shadow mode")
+    parser.add_argument('version', nargs='?')
+    parser.add_argument('--format', choices=NATIVE_MODEL_FORMATS, default='ubj')
+    parser.add_argument('--from', dest='source', help="publish: directory with the artifacts (default: models/)")
+    parser.add_argument('--off', action='store_true', help="shadow: stop shadow scoring")
+    args = parser.parse_args()
+
+    if args.command in ('publish', 'promote') or (args.command == 'shadow' and not args.off):
+        if args.version is None:
+            parser.error(f"{args.command} needs a VERSION")
+
+    warnings.filterwarnings('ignore')
+    if args.command == 'list':
+        current, shadow = registry.read_pointer(CURRENT_POINTER), registry.read_pointer(SHADOW_POINTER)
+        for name in registry.versions():
+            marks = [label for label, pointer in (('current', current), ('shadow', shadow)) if pointer == name]
+            print(name, f"({', '.join(marks)})" if marks else "")
+        if current is None:
+            print("(serving the unversioned files in models/)")
+    elif args.command == 'publish':
+        print(f"Published {registry.publish(args.version, args.source)}")
+    elif args.command == 'promote':
+        registry.write_pointer(CURRENT_POINTER, args.version)
+        print(f"Serving {args.version} (running processes reload within {MODEL_RELOAD_INTERVAL:g}s)")
+    elif args.command == 'shadow':
+        registry.write_pointer(SHADOW_POINTER, None if args.off else args.version)
+        print("Shadow scoring off" if args.off else f"Shadow scoring {args.version}")
+    elif args.command == 'convert':
+        path = registry.convert(args.format)
+        print(f"Wrote {path} ({os.path.getsize(path)} bytes)")
+        # The native model must predict exactly like the pickled one before it is used.
+        pickled = ModelRegistry._unpickle(registry.model_path)
+        native = ModelRegistry._load_native(path)
+        scaler = ModelRegistry._unpickle(registry.scaler_path)
+        label_encoder_sex = ModelRegistry._unpickle(registry.label_encoder_sex_path)
+        from inference import FastPredictor, random_records
+        records = REFERENCE_RECORDS + random_records(10000)
+        reference = FastPredictor(pickled, scaler, label_encoder_sex)
+        matrix = reference.transform(records)
+        same = (reference.predict_proba_matrix(matrix).tobytes()
+                == FastPredictor(native, scaler, label_encoder_sex).predict_proba_matrix(matrix).tobytes())
+        print("parity with the pickled model:", same)
+        if not same:
+            os.remove(path)
+            raise SystemExit("Native model disagrees with the pickled model; removed it")
+    else:
+        print(json.dumps(cold_start_report(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
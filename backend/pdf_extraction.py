@@ -0,0 +1,301 @@
+import io
+import re  # For regex extraction
+import time
+
+from lab_templates import template_registry
+
+# CBC feature → label used for it in the report table.
+CBC_MAPPINGS = {
+    'Hemoglobin': "Hemoglobin",
+    'Leucocyte': "Total Leukocyte Count",
+    'Thrombocyte': "Platelet Count",
+    'Erythrocyte': "Total RBC Count",
+    'Hematocrit': "Hematocrit Value, Hct",
+    'Mcv': "Mean Corpuscular Volume, MCV",
+    'Mch': "Mean Cell Haemoglobin, MCH",
+    'Mchc': "Mean Cell Haemoglobin CON, MCHC"
+}
+REQUIRED_FEATURES = ['Hemoglobin', 'Leucocyte', 'Thrombocyte', 'Erythrocyte',
+                     'Hematocrit', 'Mcv', 'Mch', 'Mchc', 'Age', 'Sex']
+# How many lines below a label we look for its value when it is not on the label's line.
+MAX_VALUE_LOOKAHEAD = 5
+
+# Everything the parser looks for, as one alternation of plain literals matched against
+# the upper-cased text. Keeping it literal-only (no groups or flags) lets the regex engine
+# skip ahead quickly, so each page of text is scanned once at close to str.find speed.
+# Labels are listed longest first so a label never shadows a longer one.
+_AGE_TOKEN = "AGE:"
+_SEX_TOKEN = "SEX:"
+_SECTION_TOKEN = "COMPLETE BLOOD COUNT"
+_HEADER_TOKEN = "TEST"
+_FEATURE_BY_TOKEN = {label.upper(): feature for feature, label in CBC_MAPPINGS.items()}
+_REPORT_PATTERN = re.compile("|".join(
+    re.escape(token) for token in
+    [_AGE_TOKEN, _SEX_TOKEN, _SECTION_TOKEN, _HEADER_TOKEN]
+    + sorted(_FEATURE_BY_TOKEN, key=len, reverse=True)
+))
+_AGE_VALUE_PATTERN = re.compile(r"[ \t]*(\d+(\.\d+)?)")
+_SEX_VALUE_PATTERN = re.compile(r"[ \t]*([MF])")
+_NUMBER_PATTERN = re.compile(r"(\d+(\.\d+)?)")
+
+_REQUIRED_COUNT = len(REQUIRED_FEATURES)
+
+
+class ReportParseError(ValueError):
+    """
+    The report could not be parsed into features. `reason` is one of unreadable_pdf,
+    no_cbc_section, no_table_header, missing_value, missing_feature or bad_sex.
+    """
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+    def __reduce__(self):
+        # Keeps `reason` when the error is sent back from an extraction worker process.
+        return self.__class__, (self.args[0], self.reason)
+
+_SEEKING_SECTION, _SEEKING_HEADER, _IN_TABLE = range(3)
+
+
+class CBCReportParser:
+    """
+    Single-pass parser for the text of a CBC report. Text is fed in order (for example
+    one page at a time) and scanned once with a single compiled pattern; parsing stops as
+    soon as Age, Sex and all eight CBC values have been found.
+    """
+
+    def __init__(self):
+        self.extracted_data = {}
+        self._state = _SEEKING_SECTION
+        # Features whose value was not on their label's line, and how many more
+        # non-empty lines we may look at for it (this carries over between pages).
+        self._pending = []
+        self._lookahead_left = 0
+
+    @property
+    def complete(self):
+        return not self._pending and len(self.extracted_data) == _REQUIRED_COUNT
+
+    def feed(self, text):
+        """Consumes a chunk of report text. Returns True once every feature has been found."""
+        data = self.extracted_data
+        pending = self._pending
+        text = text.upper()
+        if pending:
+            self._resolve_pending(text, 0)
+
+        for match in _REPORT_PATTERN.finditer(text):
+            token = match.group(0)
+            start = match.start()
+            line_start = text.rfind("\n", 0, start) + 1
+            feature = _FEATURE_BY_TOKEN.get(token)
+
+            if feature is not None:
+                # --- Extract CBC Test Values ---
+                if self._state != _IN_TABLE or feature in data or feature in pending:
+                    continue
+                line_end = text.find("\n", match.end())
+                if line_end == -1:
+                    line_end = len(text)
+                # First try to extract a numeric value from the same line.
+                number_match = _NUMBER_PATTERN.search(text, line_start, line_end)
+                if number_match:
+                    data[feature] = float(number_match.group(1))
+                else:
+                    # If not found, then look at the next few lines.
+                    pending.append(feature)
+                    self._lookahead_left = MAX_VALUE_LOOKAHEAD
+                    self._resolve_pending(text, line_end + 1)
+            elif token == _AGE_TOKEN or token == _SEX_TOKEN:
+                # --- Patient Info (only where the line starts with "Age:" / "Sex:") ---
+                # The first such line wins, as for the CBC values: parsing may stop
+                # before a later one is ever read.
+                patient_feature = "Age" if token == _AGE_TOKEN else "Sex"
+                if patient_feature in data or text[line_start:start].strip():
+                    continue
+                if token == _AGE_TOKEN:
+                    age_match = _AGE_VALUE_PATTERN.match(text, match.end())
+                    if age_match:
+                        data["Age"] = float(age_match.group(1))
+                else:
+                    sex_match = _SEX_VALUE_PATTERN.match(text, match.end())
+                    if sex_match:
+                        data["Sex"] = sex_match.group(1)
+            elif self._state == _SEEKING_SECTION:
+                # --- Locate the CBC section by finding "COMPLETE BLOOD COUNT" ---
+                if token == _SECTION_TOKEN:
+                    self._state = _SEEKING_HEADER
+            elif self._state == _SEEKING_HEADER:
+                # --- Find the table header (e.g., a line containing "TEST") ---
+                if token == _HEADER_TOKEN:
+                    self._state = _IN_TABLE
+
+            if len(data) == _REQUIRED_COUNT and not self._pending:
+                return True
+        return False
+
+    def _resolve_pending(self, text, pos):
+        """Looks for a bare number on the non-empty lines of `text` starting at `pos`."""
+        while self._lookahead_left > 0 and pos < len(text):
+            line_end = text.find("\n", pos)
+            if line_end == -1:
+                line_end = len(text)
+            line = text[pos:line_end].strip()
+            pos = line_end + 1
+            if not line:
+                continue
+            try:
+                value = float(line.replace(",", ""))
+            except ValueError:
+                self._lookahead_left -= 1
+                continue
+            for feature in self._pending:
+                self.extracted_data[feature] = value
+            self._pending.clear()
+            self._lookahead_left = 0
+            return
+        if self._pending and self._lookahead_left <= 0:
+            raise ReportParseError(f"Could not extract numeric value for {self._pending[0]}", 'missing_value')
+
+    def finish(self):
+        """Validates what was parsed and returns (features, extracted_data)."""
+        if self._state == _SEEKING_SECTION:
+            raise ReportParseError("Could not locate CBC section in the report.", 'no_cbc_section')
+        if self._state == _SEEKING_HEADER:
+            raise ReportParseError("Could not locate CBC table header in the report.", 'no_table_header')
+        if self._pending:
+            raise ReportParseError(f"Could not extract numeric value for {self._pending[0]}", 'missing_value')
+
+        return build_features(self.extracted_data)
+
+
+def build_features(extracted_data):
+    """
+    Validates the raw values read from a report (by the parser or a lab template) and
+    returns (features, extracted_data), with features in the order the model expects.
+    """
+    for feat in REQUIRED_FEATURES:
+        if feat not in extracted_data:
+            raise ReportParseError(f"Missing required feature: {feat}", 'missing_feature')
+
+    # --- Process Sex Field ---
+    sex_val = extracted_data["Sex"]
+    if sex_val in ['1', '1.0']:
+        extracted_data["Sex"] = 'M'
+    elif sex_val in ['0', '0.0']:
+        extracted_data["Sex"] = 'F'
+    if extracted_data["Sex"] not in ['M', 'F']:
+        raise ReportParseError(f"Invalid value for Sex: {extracted_data['Sex']}. Must be M, F, 1, or 0", 'bad_sex')
+
+    # Build the features list in the order required by the model.
+    features = [
+        extracted_data['Hematocrit'],
+        extracted_data['Hemoglobin'],
+        extracted_data['Erythrocyte'],
+        extracted_data['Leucocyte'],
+        extracted_data['Thrombocyte'],
+        extracted_data['Mch'],
+        extracted_data['Mchc'],
+        extracted_data['Mcv'],
+        extracted_data['Age'],
+        1 if extracted_data['Sex'] == 'M' else 0
+    ]
+
+    return features, extracted_data
+
+
+def parse_report_text(text):
+    """Parses the text of a CBC report; returns (features, extracted_data)."""
+    parser = CBCReportParser()
+    parser.feed(text)
+    return parser.finish()
+
+
+def extract_features_with_stats(source):
+    """
+    Same as extract_features_from_pdf, but also returns per-document statistics:
+    (features, extracted_data, {"pages_total", "pages_read", "pages_skipped", "template",
+    "template_result", "timings"}). "timings" holds the seconds spent opening the PDF,
+    trying the lab templates, laying out page text and parsing it.
+
+    A document that matches a lab template (lab_templates.json) is read from the
+    template's boxes only. Otherwise ("template_result" miss, or fallback when a matched
+    template's boxes did not hold valid values) pages are laid out and parsed one at a
+    time, and no further pages are read once Age, Sex and all CBC values have been found
+    (the CBC table is usually on page 1).
+    """
+    import pdfplumber  # Using pdfplumber for PDF extraction (imported here, in the worker, on first use)
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    parser = CBCReportParser()
+    stats = {"pages_total": 0, "pages_read": 0, "pages_skipped": 0, "template": None, "template_result": "miss"}
+    timings = {"pdf_open": 0.0, "template": 0.0, "pdf_text": 0.0, "parse": 0.0}
+    result = None
+    started = time.perf_counter()
+    try:
+        with pdfplumber.open(source) as pdf:
+            stats["pages_total"] = len(pdf.pages)
+            timings["pdf_open"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            template, values = template_registry.extract(pdf.pages)
+            if template is not None:
+                stats["template"] = template.name
+                try:
+                    result = build_features(values) if values is not None else None
+                except ReportParseError:
+                    result = None
+                stats["template_result"] = "hit" if result is not None else "fallback"
+                if result is not None:
+                    stats["pages_read"] = template.page + 1
+            timings["template"] = time.perf_counter() - started
+
+            if result is None:
+                for page in pdf.pages:
+                    started = time.perf_counter()
+                    page_text = page.extract_text()
+                    stats["pages_read"] += 1
+                    # Drop the page's layout objects before moving on to the next one.
+                    page.close()
+                    timings["pdf_text"] += time.perf_counter() - started
+                    started = time.perf_counter()
+                    done = bool(page_text) and parser.feed(page_text + "\n")
+                    timings["parse"] += time.perf_counter() - started
+                    if done:
+                        break
+    except ReportParseError:
+        raise
+    except Exception as e:
+        # pdfplumber/pdfminer could not read the file; keep their message.
+        raise ReportParseError(str(e), 'unreadable_pdf') from e
+    stats["pages_skipped"] = stats["pages_total"] - stats["pages_read"]
+
+    if result is None:
+        started = time.perf_counter()
+        result = parser.finish()
+        timings["parse"] += time.perf_counter() - started
+    features, extracted_data = result
+    stats["timings"] = timings
+    return features, extracted_data, stats
+
+
+def extract_features_from_pdf(source):
+    """
+    Extracts required features from a CBC report using pdfplumber.
+    `source` may be a file path, the raw PDF bytes or a binary file-like object, so
+    uploads can be parsed from memory without touching the disk.
+    This function extracts patient info (Age and Sex) and CBC test values based on
+    the provided report format. Expected tests and their labels:
+      - Hemoglobin              → "Hemoglobin"
+      - Leucocyte               → "Total Leukocyte Count"
+      - Thrombocyte             → "Platelet Count" (may include "(Thrombocyte)")
+      - Erythrocyte             → "Total RBC Count" (may include "(Erythrocyte)")
+      - Hematocrit              → "Hematocrit Value, Hct"
+      - Mcv                     → "Mean Corpuscular Volume, MCV"
+      - Mch                     → "Mean Cell Haemoglobin, MCH"
+      - Mchc                    → "Mean Cell Haemoglobin CON, MCHC"
+    """
+    features, extracted_data, _ = extract_features_with_stats(source)
+    return features, extracted_data
@@ -0,0 +1,114 @@
+"""
+Cheap structural checks of an uploaded PDF, run in the request thread before the document
+is sent to the extraction pool.
+
+Only the header, the cross-reference table and trailer, and the page tree are read (with
+PyPDF2, which parses objects lazily); no page content is decoded. That is enough to turn
+away, in a few milliseconds, files that would otherwise tie up an extraction worker and
+then fail: files that are not PDFs, password-protected PDFs, documents with more pages
+than a CBC report plausibly has, and scanned reports without a text layer.
+
+Rejections raise PrecheckError, a ReportParseError, so they are reported and counted
+like any other document that cannot be read.
+"""
+import io
+import os
+
+from pdf_extraction import ReportParseError
+
+# Set to 0 to send every upload straight to extraction.
+PDF_PRECHECK = os.environ.get('PDF_PRECHECK', '1') == '1'
+# Documents with more pages than this are rejected.
+PDF_MAX_PAGES = int(os.environ.get('PDF_MAX_PAGES', 50))
+# Reject documents with no fonts (no text layer) on any of their first
+# PDF_TEXT_CHECK_PAGES pages, e.g. scanned images. Set to 0 to accept them.
+PDF_REQUIRE_TEXT = os.environ.get('PDF_REQUIRE_TEXT', '1') == '1'
+PDF_TEXT_CHECK_PAGES = int(os.environ.get('PDF_TEXT_CHECK_PAGES', 3))
+
+PDF_MAGIC = b"%PDF-"
+# Readers accept the header anywhere in the first 1024 bytes.
+HEADER_SEARCH_BYTES = 1024
+# How deep to look into form XObjects (content drawn from a nested resource dictionary).
+MAX_XOBJECT_DEPTH = 2
+
+
+class PrecheckError(ReportParseError):
+    """A document rejected before extraction; `reason` is not_pdf, unreadable_pdf, encrypted,
+    too_many_pages or no_text_layer."""
+
+
+def _header(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:HEADER_SEARCH_BYTES])
+    with open(source, 'rb') as f:
+        return f.read(HEADER_SEARCH_BYTES)
+
+
+def _page_count(reader):
+    # /Count of the root page tree node, without walking the tree.
+    try:
+        return int(reader.trailer['/Root']['/Pages']['/Count'])
+    except Exception:
+        return len(reader.pages)
+
+
+def _has_fonts(resources, depth=0):
+    if resources is None:
+        return False
+    resources = resources.get_object()
+    if resources.get('/Font'):
+        return True
+    if depth >= MAX_XOBJECT_DEPTH:
+        return False
+    xobjects = resources.get('/XObject')
+    for xobject in (xobjects.get_object().values() if xobjects else []):
+        xobject = xobject.get_object()
+        if xobject.get('/Subtype') == '/Form' and _has_fonts(xobject.get('/Resources'), depth + 1):
+            return True
+    return False
+
+
+def precheck_pdf(source, max_pages=PDF_MAX_PAGES, require_text=PDF_REQUIRE_TEXT,
+                 text_check_pages=PDF_TEXT_CHECK_PAGES):
+    """
+    Checks a PDF given as bytes or a file path. Returns {"pages", "encrypted", "text_layer"}
+    (text_layer is None when it was not checked) or raises PrecheckError.
+    """
+    if PDF_MAGIC not in _header(source):
+        raise PrecheckError("The file is not a PDF document", 'not_pdf')
+
+    from PyPDF2 import PdfReader  # imported on first use, like pdfplumber in pdf_extraction
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    try:
+        reader = PdfReader(source, strict=False)
+        encrypted = reader.is_encrypted
+        if encrypted:
+            try:
+                # Many PDFs are encrypted only to restrict printing or copying and open
+                # with an empty password, as pdfplumber does.
+                decrypted = reader.decrypt("")
+            except Exception:
+                # The cipher needs an optional dependency here; leave it to extraction.
+                return {"pages": None, "encrypted": True, "text_layer": None}
+            if not decrypted:
+                raise PrecheckError("The PDF is password protected", 'encrypted')
+
+        pages = _page_count(reader)
+        if pages > max_pages:
+            raise PrecheckError(f"The PDF has {pages} pages (at most {max_pages} are accepted)", 'too_many_pages')
+        if pages == 0:
+            raise PrecheckError("The PDF has no pages", 'unreadable_pdf')
+
+        text_layer = None
+        if require_text:
+            text_layer = any(_has_fonts(reader.pages[index].get('/Resources'))
+                             for index in range(min(pages, text_check_pages)))
+            if not text_layer:
+                raise PrecheckError("The PDF has no text layer (is it a scanned image?)", 'no_text_layer')
+    except PrecheckError:
+        raise
+    except Exception as e:
+        raise PrecheckError(f"Could not read the PDF: {e}", 'unreadable_pdf') from e
+    return {"pages": pages, "encrypted": encrypted, "text_layer": text_layer}
@@ -0,0 +1,170 @@
+"""
+Rendering of the detailed analysis report.
+
+Medical terms in findings and treatments are highlighted in a single pass of one compiled
+pattern instead of one str.replace per term, and the highlighted HTML of every finding and
+treatment text is cached, so the static texts produced by analyze_blood_report are only
+highlighted once per process. The report itself is assembled with a single join.
+
+structured_report() returns the same content as plain data (text segments flagged for
+highlighting) for clients that render the report themselves.
+"""
+import re
+from functools import lru_cache
+
+DANGER_SPAN = "<span class='text-danger'>{}</span>"
+SUCCESS_SPAN = "<span class='text-success'>{}</span>"
+
+# Terms highlighted in findings and treatments, in the order the report used to apply them.
+# A trailing space is kept outside the highlight ("Low " -> "<span ...>Low</span> ").
+FINDING_TERMS = [
+    "Low ", "High ", "Elevated ", "hemoglobin", "hematocrit", "MCV", "MCHC",
+    "white blood cell count", "platelet count", "infection", "inflammation",
+    "iron deficiency", "vitamin B12", "folate deficiency", "acute blood loss",
+    "chronic disease", "myeloproliferative", "polycythemia vera", "secondary polycythemia",
+    "hereditary spherocytosis",
+]
+TREATMENT_TERMS = [
+    "iron supplements", "ferrous sulfate", "vitamin B12", "folic acid", "antibiotic therapy",
+    "CBC", "JAK2 mutation analysis", "therapeutic phlebotomy", "cytoreductive therapy",
+    "hydroxyurea", "iron studies", "reticulocyte count", "kidney function",
+    "osmotic fragility testing", "inflammatory markers",
+]
+
+HEALTHY_RECOMMENDATIONS = [
+    [("Maintain current health status", None)],
+    [("Continue regular ", None), ("exercise", "success"), (" and ", None),
+     ("balanced diet", "success")],
+    [("Schedule routine follow-up in ", None), ("12 months", "success")],
+]
+HEALTHY_SUMMARY = "All blood parameters are within normal ranges"
+
+
+def _overlaps(a, b):
+    """True when `a` and `b` can share characters in some text (containment or a suffix/prefix match)."""
+    if a in b or b in a:
+        return True
+    return any(a.endswith(b[:k]) or b.endswith(a[:k]) for k in range(1, min(len(a), len(b))))
+
+
+class Highlighter:
+    """
+    Wraps every occurrence of `terms` in a text-danger span in one regex pass.
+
+    This gives exactly what applying the replacements one after another did whenever the
+    matches cannot interact. Terms that could overlap each other in a text (such as
+    "polycythemia vera" and "secondary polycythemia") are found up front; a text that
+    contains both of such a pair is highlighted with the original sequential replacements.
+    """
+
+    def __init__(self, terms):
+        self.terms = list(terms)
+        markup = DANGER_SPAN.format("")
+        for term in self.terms:
+            if term in markup or "<" in term or ">" in term:
+                raise ValueError(f"Highlight term clashes with the highlight markup: {term!r}")
+        self.replacements = {term: DANGER_SPAN.format(term.rstrip()) + term[len(term.rstrip()):]
+                             for term in self.terms}
+        self.overlapping_pairs = [(a, b) for i, a in enumerate(self.terms)
+                                  for b in self.terms[i + 1:] if _overlaps(a, b)]
+        self.pattern = re.compile("|".join(
+            re.escape(term) for term in sorted(self.terms, key=len, reverse=True)))
+
+    def _sequential(self, text):
+        for term in self.terms:
+            text = text.replace(term, self.replacements[term])
+        return text
+
+    def highlight(self, text):
+        for a, b in self.overlapping_pairs:
+            if a in text and b in text:
+                return self._sequential(text)
+        return self.pattern.sub(lambda match: self.replacements[match.group(0)], text)
+
+    def segments(self, text):
+        """`text` as a list of {"text", "highlight"} segments."""
+        segments = []
+        pos = 0
+        for match in self.pattern.finditer(text):
+            word = match.group(0).rstrip()
+            if match.start() > pos:
+                segments.append({"text": text[pos:match.start()], "highlight": None})
+            segments.append({"text": word, "highlight": "danger"})
+            pos = match.start() + len(word)
+        if pos < len(text):
+            segments.append({"text": text[pos:], "highlight": None})
+        return segments
+
+
+finding_highlighter = Highlighter(FINDING_TERMS)
+treatment_highlighter = Highlighter(TREATMENT_TERMS)
+
+
+@lru_cache(maxsize=1024)
+def highlight_finding(finding):
+    return finding_highlighter.highlight(finding)
+
+
+@lru_cache(maxsize=1024)
+def highlight_treatment(treatment):
+    return treatment_highlighter.highlight(treatment)
+
+
+_HEALTHY_BODY = "".join([
+    "Status: ", SUCCESS_SPAN.format("Healthy"), "\n\n",
+    "Possible Conditions:\n",
+    "• ", SUCCESS_SPAN.format(HEALTHY_SUMMARY), "\n\n",
+    "Recommendations:\n",
+    *("• " + "".join(SUCCESS_SPAN.format(text) if style else text for text, style in line) + "\n"
+      for line in HEALTHY_RECOMMENDATIONS),
+])
+
+
+def generate_report(analysis_results, feature_dict):
+    """The detailed analysis report as the HTML-highlighted text shown by the frontend."""
+    parts = ["BLOOD ANALYSIS REPORT\n\n"]
+
+    # For unhealthy patients (with conditions)
+    if analysis_results['conditions']:
+        parts.append("Status: <span class='text-danger'>Requires Medical Attention</span>\n\n")
+        parts.append("Possible Conditions:\n")
+        for condition in analysis_results['conditions']:
+            parts.append(f"• {DANGER_SPAN.format(condition)}\n")
+
+        parts.append("\nDetailed Analysis:\n")
+        for finding in analysis_results['findings']:
+            parts.append(f"• {highlight_finding(finding)}\n")
+
+        parts.append("\nRecommended Actions:\n")
+        for treatment in analysis_results['treatments']:
+            parts.append(f"• {highlight_treatment(treatment)}\n")
+
+    # For healthy patients (no conditions)
+    else:
+        parts.append(_HEALTHY_BODY)
+
+    parts.append("\nPatient Info:\n")
+    parts.append(f"• Age: {feature_dict['Age']} years\n")
+    parts.append(f"• Sex: {feature_dict['Sex']}\n")
+    return "".join(parts)
+
+
+def structured_report(analysis_results, feature_dict):
+    """The same report as data: conditions, and findings/treatments as highlighted segments."""
+    if analysis_results['conditions']:
+        return {
+            "status": "requires_attention",
+            "conditions": list(analysis_results['conditions']),
+            "findings": [finding_highlighter.segments(finding) for finding in analysis_results['findings']],
+            "treatments": [treatment_highlighter.segments(treatment)
+                           for treatment in analysis_results['treatments']],
+            "patient": {"age": feature_dict['Age'], "sex": feature_dict['Sex']},
+        }
+    return {
+        "status": "healthy",
+        "conditions": [],
+        "summary": HEALTHY_SUMMARY,
+        "recommendations": [[{"text": text, "highlight": style} for text, style in line]
+                            for line in HEALTHY_RECOMMENDATIONS],
+        "patient": {"age": feature_dict['Age'], "sex": feature_dict['Sex']},
+    }
@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Maximum number of cached responses (per process in memory, and in the on-disk table).
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 1024))
+# Seconds a cached response stays valid.
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 3600))
+# Optional SQLite file so cached responses survive worker restarts and are shared
+# between gunicorn workers. Leave unset for an in-memory cache only.
+RESULT_CACHE_PATH = os.environ.get('RESULT_CACHE_PATH')
+
+
+def file_digest(paths):
+    """Hash of the given files' contents, used as the model version in cache keys."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def pdf_cache_key(source, model_version, variant=""):
+    """
+    Cache key for an uploaded PDF given as bytes or as the path of a spilled upload.
+    `variant` separates differently shaped responses for the same input.
+    """
+    digest = hashlib.sha256(f"pdf:{model_version}:{variant}:".encode())
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    else:
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def features_cache_key(raw_feature_dict, model_version, variant=""):
+    """
+    Cache key for a manual feature record. Numeric fields are normalised through float
+    so "12", 12 and 12.0 share an entry; Sex is left as sent since the encoder is strict.
+    """
+    normalized = [repr(float(value)) if field != 'Sex' else str(value)
+                  for field, value in sorted(raw_feature_dict.items())]
+    payload = f"features:{model_version}:{variant}:" + "|".join(normalized)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    LRU + TTL cache of JSON prediction responses, with an optional SQLite backend.
+    Lookups hit the in-process LRU first and fall back to the on-disk table.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL, path=RESULT_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+
+    def _connect(self):
+        # Opened lazily and again in each process: the app is imported in the gunicorn
+        # master, and an SQLite connection must not be used across fork(). Call with _lock held.
+        if not self.path:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            db.commit()
+            self._db, self._db_pid = db, os.getpid()
+        return self._db
+
+    def get(self, key):
+        if self.max_entries <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+
+            db = self._connect()
+            if db is not None:
+                row = db.execute(
+                    "SELECT value, expires_at FROM result_cache WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+                if row is not None:
+                    db.execute("UPDATE result_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                    db.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            db = self._connect()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO result_cache (key, value, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), expires_at, now),
+                )
+                db.execute("DELETE FROM result_cache WHERE expires_at <= ?", (now,))
+                db.execute(
+                    "DELETE FROM result_cache WHERE key NOT IN "
+                    "(SELECT key FROM result_cache ORDER BY accessed_at DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+                db.commit()
+
+    def _remember(self, key, value, expires_at):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            db = self._connect()
+            if db is not None:
+                db.execute("DELETE FROM result_cache")
+                db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "disk_backend": bool(self.path),
+            }
+            db = self._connect()
+            if db is not None:
+                stats["disk_size"] = db.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+            return stats
+
+
+result_cache = ResultCache()
@@ -0,0 +1,245 @@
+"""
+Declarative clinical rules behind analyze_blood_report, loaded from rules.json.
+
+The table is a list of groups evaluated in order. A group fires at most one of its
+branches: the first whose conditions hold (if/elif), and a branch without conditions is
+the group's `else`. A group-level "when" must hold before any branch is tried. Conditions
+are [feature, operator, threshold] triples and all of them must hold. Every fired branch
+appends its conditions, findings and treatments to the analysis, in table order.
+
+The table is validated once when it is loaded (feature names must be numeric model
+features, operators and thresholds well-formed) and then evaluated two ways: by walking the
+groups as an if/elif chain for one record (the per-request path), and as NumPy masks for a
+batch, where evaluating N patients is a handful of vectorized comparisons giving an
+N x branches boolean matrix.
+
+Count how many rows of a CSV or NDJSON archive meet each condition:
+    python rules.py archive.csv [--format csv|ndjson]
+"""
+import os
+import json
+import operator
+
+import numpy as np
+
+from inference import NUMERIC_FIELDS
+
+# JSON rule table used by analyze_blood_report.
+RULES_PATH = os.environ.get('RULES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json'))
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+
+def _compile_conditions(conditions, where):
+    """Validated (feature, operator, threshold) triples."""
+    compiled = []
+    for condition in conditions:
+        if not (isinstance(condition, list) and len(condition) == 3):
+            raise ValueError(f"{where}: a condition must be [feature, operator, threshold], got {condition!r}")
+        feature, op, threshold = condition
+        if op not in OPERATORS:
+            raise ValueError(f"{where}: unknown operator {op!r}")
+        if not isinstance(threshold, (int, float)) or isinstance(threshold, bool):
+            raise ValueError(f"{where}: threshold must be a number, got {threshold!r}")
+        if feature not in NUMERIC_FIELDS:
+            raise ValueError(f"{where}: unknown feature {feature!r} (expected one of {', '.join(NUMERIC_FIELDS)})")
+        compiled.append((feature, op, threshold))
+    return tuple(compiled)
+
+
+def _tests(conditions):
+    """(feature, comparison function, threshold) for each of `conditions`."""
+    return tuple((feature, OPERATORS[op], threshold) for feature, op, threshold in conditions)
+
+
+class Branch:
+    def __init__(self, spec, where):
+        self.when = _compile_conditions(spec.get('when', []), where)
+        self.conditions = tuple(spec.get('conditions', []))
+        self.findings = tuple(spec.get('findings', []))
+        self.treatments = tuple(spec.get('treatments', []))
+
+
+class RuleGroup:
+    def __init__(self, spec, index):
+        self.name = spec.get('name', f"group {index}")
+        self.when = _compile_conditions(spec.get('when', []), self.name)
+        self.branches = [Branch(branch, f"{self.name} branch {position}")
+                         for position, branch in enumerate(spec.get('branches', []))]
+        if not self.branches:
+            raise ValueError(f"{self.name}: a group needs at least one branch")
+        if any(not branch.when for branch in self.branches[:-1]):
+            raise ValueError(f"{self.name}: only the last branch may have no conditions (the else)")
+
+
+class RuleSet:
+    """A compiled rule table; see the module docstring for the table's semantics."""
+
+    def __init__(self, table):
+        self.groups = [RuleGroup(group, index) for index, group in enumerate(table.get('groups', []))]
+        # Branches in table order: the columns of the matrix evaluate_batch returns.
+        self.branches = [branch for group in self.groups for branch in group.branches]
+        self.features = sorted({feature
+                                for group in self.groups
+                                for conditions in [group.when] + [branch.when for branch in group.branches]
+                                for feature, _, _ in conditions})
+        # Per group: its own tests and, in order, each branch's tests with the branch.
+        self._plan = [(_tests(group.when), [(_tests(branch.when), branch) for branch in group.branches])
+                      for group in self.groups]
+
+    @classmethod
+    def load(cls, path=RULES_PATH):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def evaluate(self, features):
+        """
+        {"conditions": [...], "findings": [...], "treatments": [...]} for one record: each
+        group whose tests hold contributes its first branch whose tests hold.
+        """
+        conditions, findings, treatments = [], [], []
+        for group_tests, branches in self._plan:
+            for feature, compare, threshold in group_tests:
+                if not compare(features[feature], threshold):
+                    break
+            else:
+                for branch_tests, branch in branches:
+                    for feature, compare, threshold in branch_tests:
+                        if not compare(features[feature], threshold):
+                            break
+                    else:
+                        conditions.extend(branch.conditions)
+                        findings.extend(branch.findings)
+                        treatments.extend(branch.treatments)
+                        break
+        return {'conditions': conditions, 'findings': findings, 'treatments': treatments}
+
+    def columns(self, records):
+        """
+        Float arrays of the features the rules use, from a list of records or from a
+        mapping of feature -> values (a dict of arrays or a pandas DataFrame).
+        """
+        if isinstance(records, (list, tuple)):
+            return {feature: np.fromiter((record[feature] for record in records), dtype=np.float64,
+                                         count=len(records))
+                    for feature in self.features}
+        return {feature: np.asarray(records[feature], dtype=np.float64) for feature in self.features}
+
+    def evaluate_batch(self, records):
+        """
+        Boolean matrix of shape (rows, len(self.branches)): entry [i, j] is True when
+        branch j fires for row i. Comparisons with NaN are False, as they are in evaluate().
+        """
+        columns = self.columns(records)
+        rows = len(next(iter(columns.values()))) if columns else len(records)
+        fired = np.zeros((rows, len(self.branches)), dtype=bool)
+
+        def mask(conditions):
+            result = np.ones(rows, dtype=bool)
+            for feature, op, threshold in conditions:
+                result &= OPERATORS[op](columns[feature], threshold)
+            return result
+
+        column = 0
+        for group in self.groups:
+            # Rows still looking for a branch of this group (the elif chain).
+            remaining = mask(group.when)
+            for branch in group.branches:
+                hit = remaining & mask(branch.when)
+                fired[:, column] = hit
+                remaining &= ~hit
+                column += 1
+        return fired
+
+    def analyses(self, fired):
+        """
+        One analysis per row of an evaluate_batch() matrix, with tuples in place of lists.
+        Rows that fired the same branches share one analysis, so treat it as read-only.
+        """
+        # Patients share a handful of distinct rule combinations; build each one once.
+        # Rows are grouped by their fired branches packed into one integer.
+        if fired.shape[1] <= 62:
+            codes = fired.astype(np.int64) @ (np.int64(1) << np.arange(fired.shape[1], dtype=np.int64))
+            patterns, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+            patterns = fired[first]
+        else:
+            patterns, inverse = np.unique(fired, axis=0, return_inverse=True)
+        built = []
+        for pattern in patterns:
+            branches = [self.branches[column] for column in np.flatnonzero(pattern)]
+            built.append({
+                'conditions': tuple(text for branch in branches for text in branch.conditions),
+                'findings': tuple(text for branch in branches for text in branch.findings),
+                'treatments': tuple(text for branch in branches for text in branch.treatments),
+            })
+        return list(map(built.__getitem__, inverse.ravel().tolist()))
+
+    def analyze_batch(self, records):
+        """evaluate() for every record, computed as one matrix operation (read-only; see analyses())."""
+        if not len(records):
+            return []
+        return self.analyses(self.evaluate_batch(records))
+
+    def condition_counts(self, fired):
+        """How many rows of an evaluate_batch() matrix have each condition."""
+        totals = fired.sum(axis=0)
+        counts = {}
+        for branch, total in zip(self.branches, totals.tolist()):
+            for condition in branch.conditions:
+                counts[condition] = counts.get(condition, 0) + total
+        return counts
+
+
+rule_set = RuleSet.load()
+
+
+def main():
+    import sys
+    import argparse
+    from itertools import islice
+    from bulk_score import BULK_CHUNK_SIZE, FORMATS, detect_format, read_rows
+    from inference import build_raw_feature_dict
+
+    parser = argparse.ArgumentParser(description="Count the rows of an archive that meet each condition.")
+    parser.add_argument('input', help="CSV or NDJSON file")
+    parser.add_argument('--format', choices=FORMATS, help="input format (default: from the file name)")
+    parser.add_argument('--chunk-size', type=int, default=BULK_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    input_format = args.format or detect_format(args.input)
+    if input_format is None:
+        raise SystemExit("Cannot tell the input format from the file name; pass --format")
+
+    counts = {condition: 0 for branch in rule_set.branches for condition in branch.conditions}
+    rows = skipped = 0
+    with open(args.input, encoding='utf-8', newline='') as source:
+        rows_iter = read_rows(source, input_format)
+        while True:
+            chunk = list(islice(rows_iter, args.chunk_size))
+            if not chunk:
+                break
+            records = []
+            for row in chunk:
+                try:
+                    records.append(build_raw_feature_dict(row))
+                except Exception:
+                    skipped += 1
+            rows += len(chunk)
+            if records:
+                for condition, total in rule_set.condition_counts(rule_set.evaluate_batch(records)).items():
+                    counts[condition] += total
+
+    for condition, total in counts.items():
+        print(f"{condition:25} {total:10d}")
+    print(f"{rows} rows, {skipped} skipped", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
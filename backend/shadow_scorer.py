@@ -0,0 +1,143 @@
+"""
+Shadow scoring of a candidate model version against the one being served.
+
+When models/SHADOW names a version (see model_registry.py), every batch of records the
+served model scores is handed, with its predictions, to a background thread that scores
+the same records with the candidate and records how often the two agree and how long
+each took per record. Nothing of this runs on the response path: handing a batch over is
+a put_nowait() on a bounded queue, and when the queue is full the batch is dropped (and
+counted) rather than making the request wait. The candidate transforms the raw records
+with its own scaler and encoder, which may differ from the served version's.
+
+The figures are served by GET /models and /metrics, and start over whenever the pair of
+versions being compared changes.
+"""
+import os
+import queue
+import random
+import threading
+import time
+
+from metrics import SHADOW_RECORDS, SHADOW_SECONDS
+from model_registry import registry
+
+# Batches waiting to be scored by the candidate; further ones are dropped.
+SHADOW_QUEUE_SIZE = int(os.environ.get('SHADOW_QUEUE_SIZE', 256))
+# Fraction of the scored batches that are also scored by the candidate.
+SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', 1.0))
+
+LABELS = ("incare", "outcare")
+
+
+class ShadowScorer:
+    """Scores the served model's batches again with `registry.shadow`, off the response path."""
+
+    def __init__(self, registry, max_queue=SHADOW_QUEUE_SIZE, sample_rate=SHADOW_SAMPLE_RATE):
+        self.registry = registry
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._worker = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, pair):
+        self.pair = pair
+        self.records = 0
+        self.agreements = 0
+        self.errors = 0
+        self.dropped = 0
+        self.primary_seconds = 0.0
+        self.candidate_seconds = 0.0
+        # (primary label, candidate label) -> records
+        self.confusion = {}
+
+    def _ensure_worker(self):
+        # Only a process that actually has a candidate to score starts a thread: the first
+        # queued batch starts it, in the worker serving that request, never in the master.
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name='shadow-scorer', daemon=True)
+                    self._worker.start()
+
+    def submit(self, primary, records, predictions, primary_seconds):
+        """
+        Queues records the served bundle `primary` scored as `predictions` in
+        `primary_seconds`. A no-op without a shadow version.
+        """
+        candidate = self.registry.shadow
+        if candidate is None or primary is None or not len(records):
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        try:
+            self._queue.put_nowait((primary, candidate, list(records), predictions, primary_seconds))
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return
+        self._ensure_worker()
+
+    def _run(self):
+        while True:
+            self._score(*self._queue.get())
+
+    def _score(self, primary, candidate, records, predictions, primary_seconds):
+        started = time.perf_counter()
+        try:
+            if len(records) == 1:
+                shadow_predictions = [candidate.predictor.predict_one(records[0])]
+            else:
+                shadow_predictions = candidate.predictor.predict(records).tolist()
+        except Exception:
+            shadow_predictions = None
+        candidate_seconds = time.perf_counter() - started
+
+        pairs = None
+        if shadow_predictions is not None:
+            pairs = [(LABELS[int(served)], LABELS[int(shadow)])
+                     for served, shadow in zip(predictions, shadow_predictions)]
+            agreements = sum(served == shadow for served, shadow in pairs)
+            SHADOW_RECORDS.inc(agreements, result='agree')
+            SHADOW_RECORDS.inc(len(pairs) - agreements, result='disagree')
+            SHADOW_SECONDS.observe(primary_seconds / len(records), model='primary')
+            SHADOW_SECONDS.observe(candidate_seconds / len(records), model='candidate')
+
+        with self._stats_lock:
+            pair = (primary.version, candidate.version)
+            if pair != self.pair:
+                self._reset(pair)
+            if pairs is None:
+                self.errors += 1
+                return
+            self.records += len(pairs)
+            self.agreements += agreements
+            self.primary_seconds += primary_seconds
+            self.candidate_seconds += candidate_seconds
+            for key in pairs:
+                self.confusion[key] = self.confusion.get(key, 0) + 1
+
+    def stats(self):
+        shadow = self.registry.shadow
+        with self._stats_lock:
+            return {
+                "enabled": shadow is not None,
+                "candidate": shadow.name if shadow is not None else None,
+                "primary_version": self.pair[0] if self.pair else None,
+                "candidate_version": self.pair[1] if self.pair else None,
+                "sample_rate": self.sample_rate,
+                "records": self.records,
+                "agreements": self.agreements,
+                "agreement_rate": self.agreements / self.records if self.records else 0.0,
+                "errors": self.errors,
+                "dropped": self.dropped,
+                "queue_depth": self._queue.qsize(),
+                "primary_mean_ms": self.primary_seconds / self.records * 1000 if self.records else 0.0,
+                "candidate_mean_ms": self.candidate_seconds / self.records * 1000 if self.records else 0.0,
+                "confusion": {f"{served}->{shadow}": count
+                              for (served, shadow), count in sorted(self.confusion.items())},
+            }
+
+
+shadow_scorer = ShadowScorer(registry)
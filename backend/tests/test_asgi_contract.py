@@ -0,0 +1,66 @@
+"""The ASGI app's native /predict and /predict_manual must answer like the Flask routes."""
+import io
+import os
+import glob
+
+import pytest
+from starlette.testclient import TestClient
+
+import asgi
+from app import app as flask_app
+from inference import REFERENCE_RECORDS
+
+ORIGIN = 'https://docassist-ai-ui.onrender.com'
+SAMPLE_PDF = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', '..', 'blood reports', '*.pdf')))[0]
+TOO_LARGE = b'x' * (flask_app.config['MAX_CONTENT_LENGTH'] + 1)
+
+
+@pytest.fixture(scope='module')
+def clients():
+    # Not entered as a context manager, so the ASGI lifespan (job threads) does not run.
+    return flask_app.test_client(), TestClient(asgi.app)
+
+
+def post_both(clients, path, **kwargs):
+    flask_client, asgi_client = clients
+    flask_response = flask_client.post(path, **kwargs.pop('flask'))
+    asgi_response = asgi_client.post(path, **kwargs.pop('asgi'))
+    return flask_response, asgi_response
+
+
+@pytest.mark.parametrize('case', ['too_large', 'bad_json', 'not_json'])
+def test_manual_errors_match(clients, case):
+    body, content_type = {
+        'too_large': (TOO_LARGE, 'application/json'),
+        'bad_json': (b'{"Hematocrit": ', 'application/json'),
+        'not_json': (b'{}', 'text/plain'),
+    }[case]
+    flask_response, asgi_response = post_both(
+        clients, '/predict_manual',
+        flask=dict(data=body, content_type=content_type),
+        asgi=dict(content=body, headers={'Content-Type': content_type}))
+    assert asgi_response.status_code == flask_response.status_code == 400
+    assert asgi_response.json() == flask_response.get_json()
+
+
+def test_oversized_upload_matches(clients):
+    flask_response, asgi_response = post_both(
+        clients, '/predict',
+        flask=dict(data={'file': (io.BytesIO(TOO_LARGE), 'big.pdf')}),
+        asgi=dict(files={'file': ('big.pdf', TOO_LARGE, 'application/pdf')}))
+    assert asgi_response.status_code == flask_response.status_code == 400
+    assert asgi_response.json() == flask_response.get_json()
+
+
+def test_cors_headers_on_native_routes(clients):
+    _, asgi_client = clients
+    headers = {'Origin': ORIGIN}
+    manual = asgi_client.post('/predict_manual', json=REFERENCE_RECORDS[0], headers=headers)
+    with open(SAMPLE_PDF, 'rb') as f:
+        upload = asgi_client.post('/predict', files={'file': ('report.pdf', f.read(), 'application/pdf')},
+                                  headers=headers)
+    too_large = asgi_client.post('/predict_manual', content=TOO_LARGE,
+                                 headers={**headers, 'Content-Type': 'application/json'})
+    for response in (manual, upload, too_large):
+        assert response.headers.get('access-control-allow-origin') == ORIGIN
+    assert manual.status_code == upload.status_code == 200
@@ -0,0 +1,51 @@
+"""FastPredictor must give the same answers as the pandas reference path, bit for bit."""
+import warnings
+
+import numpy as np
+import pytest
+
+from inference import REFERENCE_RECORDS, FastPredictor, PandasPredictor, random_records
+from model_registry import ModelRegistry
+
+RECORDS = REFERENCE_RECORDS + random_records(5000)
+
+
+@pytest.fixture(scope='module')
+def predictors():
+    warnings.filterwarnings('ignore')
+    bundle = ModelRegistry(reload_interval=0).get()
+    assert bundle is not None, "model artifacts failed to load"
+    return (FastPredictor(bundle.model, bundle.scaler, bundle.label_encoder_sex),
+            PandasPredictor(bundle.model, bundle.scaler, bundle.label_encoder_sex))
+
+
+def test_predict_proba_is_bit_identical(predictors):
+    fast, reference = predictors
+    fast_proba = np.asarray(fast.predict_proba(RECORDS), dtype=np.float32)
+    reference_proba = np.asarray(reference.predict_proba(RECORDS), dtype=np.float32)
+    assert fast_proba.tobytes() == reference_proba.tobytes()
+
+
+def test_predict_matches(predictors):
+    fast, reference = predictors
+    assert np.array_equal(np.asarray(fast.predict(RECORDS)), np.asarray(reference.predict(RECORDS)))
+
+
+def test_predict_one_matches(predictors):
+    fast, reference = predictors
+    mismatches = [record for record in RECORDS[:1000]
+                  if fast.predict_one(record) != reference.predict_one(record)]
+    assert mismatches == []
+
+
+def test_predict_one_matches_batch(predictors):
+    fast, _ = predictors
+    batch = np.asarray(fast.predict(RECORDS[:1000])).tolist()
+    assert [fast.predict_one(record) for record in RECORDS[:1000]] == batch
+
+
+def test_unseen_sex_is_rejected_by_both(predictors):
+    record = dict(REFERENCE_RECORDS[0], Sex='X')
+    for predictor in predictors:
+        with pytest.raises(ValueError, match="previously unseen labels"):
+            predictor.predict_one(record)
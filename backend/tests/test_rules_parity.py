@@ -0,0 +1,27 @@
+"""The rule table must give the same analysis as the original if-chain analyzer."""
+import pytest
+
+from benchmarks.rules_bench import as_lists, boundary_records, legacy_analyze_blood_report
+from inference import random_records
+from rules import RuleSet, rule_set
+
+RECORDS = boundary_records() + random_records(5000)
+
+
+@pytest.fixture(scope='module')
+def expected():
+    return [legacy_analyze_blood_report(record) for record in RECORDS]
+
+
+def test_evaluate_matches_legacy(expected):
+    assert [rule_set.evaluate(record) for record in RECORDS] == expected
+
+
+def test_analyze_batch_matches_legacy(expected):
+    assert [as_lists(analysis) for analysis in rule_set.analyze_batch(RECORDS)] == expected
+
+
+def test_unknown_feature_is_rejected():
+    table = {'groups': [{'name': 'typo', 'when': [['Hemoglobn', '<', 12]], 'branches': [{'conditions': ['x']}]}]}
+    with pytest.raises(ValueError, match="unknown feature 'Hemoglobn'"):
+        RuleSet(table)